@@ -0,0 +1,108 @@
+from .imports import *
+from . import utils
+from .zipfile2 import ZipFile
+
+
+TIERS = ['kids', 'students', 'scholars']
+
+def find_article_archive(data_dir):
+    """Returns the path of the `*_articles.zip` in `data_dir`, or None."""
+    archives = sorted(Path(data_dir).glob('*_articles.zip'))
+    return archives[0] if archives else None
+
+def read_member(zipfile, name, fields=None):
+    """Decodes the JSON archive member `name` of the open `zipfile`."""
+    zinfo = zipfile.getinfo(name)
+    with zipfile.open(zinfo) as f:
+        return utils.json_reader.readinto_loads(f, zinfo.file_size, fields)
+
+class ArticleArchive:
+    """Serves articles straight out of a downloaded `*_articles.zip`.
+
+    The archive is opened once and every `articles/<tier>/<id> <title>.json`
+    member is indexed by article id, so articles are decompressed on demand
+    instead of being extracted onto disk first. Member names come straight
+    from the compact central directory; a `ZipInfo` is only built when an
+    article is actually read.
+    """
+
+    def __init__(self, zip_path):
+        self.zip_path = Path(zip_path)
+        self.zipfile = ZipFile(str(self.zip_path), 'r', sidecar=True)
+        st = os.stat(self.zipfile.fp.fileno())
+        self.stamp_ = (st.st_mtime_ns, st.st_size)
+        self._id_to_name = None
+        self._tier_to_names = None
+
+    def _index(self):
+        # built on first use, so opening the archive stays cheap
+        self._id_to_name = {}
+        self._tier_to_names = {tier: [] for tier in TIERS}
+        for name in self.zipfile.namelist():
+            parts = name.split('/')
+            if len(parts) < 3 or parts[-3] != 'articles' or not parts[-1].endswith('.json'):
+                continue
+            tier = parts[-2]
+            if tier not in self._tier_to_names:
+                continue
+            self._tier_to_names[tier].append(name)
+            self._id_to_name[parts[-1].split(' ')[0]] = name
+
+    @property
+    def id_to_name(self):
+        if self._id_to_name is None:
+            self._index()
+        return self._id_to_name
+
+    @property
+    def tier_to_names(self):
+        if self._tier_to_names is None:
+            self._index()
+        return self._tier_to_names
+
+    def name_of(self, article_id):
+        """The member name of the article `article_id`, or None.
+
+        With a sidecar index this is a binary search for the
+        `articles/<tier>/<id> ` prefix in each tier, so a single lookup
+        doesn't decode every member name to build `id_to_name` first; only
+        ids that aren't found that way fall back to the full index.
+        """
+        if self._id_to_name is not None or not self.zipfile.indexed:
+            return self.id_to_name.get(article_id)
+        for tier in TIERS:
+            for name in self.zipfile.names_with_prefix(f'articles/{tier}/{article_id} '):
+                if name.endswith('.json'):
+                    return name
+        # not at the top level: members may sit below a root directory
+        return self.id_to_name.get(article_id)
+
+    def article_paths(self, tier='*'):
+        if tier == '*':
+            return [name for tier in TIERS for name in self.tier_to_names[tier]]
+        return list(self.tier_to_names[tier])
+
+    def read(self, name, fields=None):
+        return read_member(self.zipfile, name, fields)
+
+    def stamp(self, name):
+        # the CRC doubles as a content hash of the member
+        zinfo = self.zipfile.getinfo(name)
+        return (zinfo.CRC, zinfo.file_size)
+
+    def is_stale(self):
+        """Whether the archive on disk was replaced since it was opened."""
+        try:
+            st = os.stat(self.zip_path)
+        except OSError:
+            return True
+        return (st.st_mtime_ns, st.st_size) != self.stamp_
+
+    def article_by_id(self, article_id, fields=None):
+        name = self.name_of(article_id)
+        if name is None:
+            return None
+        return self.read(name, fields)
+
+    def close(self):
+        self.zipfile.close()
@@ -0,0 +1,64 @@
+from .imports import *
+from collections import OrderedDict
+
+
+class ArticleCache:
+    """Bounded LRU cache of decoded articles.
+
+    Entries are bounded by count (`max_entries`) and/or by the approximate
+    size of the JSON they were decoded from (`max_bytes`). Each entry keeps
+    the stamp (mtime, size) of its source, and a lookup with a different
+    stamp counts as a miss, so re-written files are never served stale.
+    Cached articles are shared between callers and should not be modified.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, stamp, article, nbytes):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+            self._entries[key] = (stamp, article, nbytes)
+            self.nbytes += nbytes
+            while self._entries and (
+                    (self.max_entries is not None and len(self._entries) > self.max_entries) or
+                    (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+                _, (_, _, evicted_nbytes) = self._entries.popitem(last=False)
+                self.nbytes -= evicted_nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.nbytes,
+        }
@@ -1,23 +1,56 @@
 from .imports import *
 from .utils import *
+from .archive import ArticleArchive, find_article_archive, read_member
+from . import utils
+from .cache import ArticleCache
+from .metadata import MetadataStore
+from .views import ArticleView
 
-def Article(p):
+def Article(p, fields=None):
+    # paths come from the tier listings, so a failure here is a missing or
+    # corrupt file rather than a misspelled name; it is skipped as None
     try:
-        return json.load(open(p))
-    except:
-        # if error with filename, glob for the article by its id
-        path = Path(p)
-        query = str(path.parent / f"{path.stem.split(' ')[0]} *.json")
-        fps = glob(query)
-        if fps:
-            return json.load(open(fps[0]))
-        else:
-            return None
+        return read_json(p, fields)
+    except (OSError, ValueError):
+        return None
         
 
+METADATA_KEYS = ['id', 'url', 'tier', 'title', 'aligned_ids', 'aligned_urls']
+
+def article_metadata(article, article_path):
+    metadata = {}
+    for key in METADATA_KEYS:
+        if key in article:
+            metadata[key] = article[key]
+    metadata['path'] = article_path
+    return metadata
+
+# state of metadata worker processes, see `_read_metadata_chunk`
+_worker_zipfile = None
+
+def _init_metadata_worker(archive_path, json_backend):
+    global _worker_zipfile
+    set_json_backend(json_backend)
+    if archive_path is not None:
+        from .zipfile2 import ZipFile
+        _worker_zipfile = ZipFile(archive_path, 'r', sidecar=True)
+
+def _read_metadata_chunk(article_paths, zipfile=None):
+    zipfile = zipfile or _worker_zipfile
+    chunk = []
+    for article_path in article_paths:
+        if zipfile is not None:
+            article = read_member(zipfile, article_path, METADATA_KEYS)
+        else:
+            article = Article(article_path, METADATA_KEYS)
+        if article is not None:
+            chunk.append(article_metadata(article, article_path))
+    return chunk
+
+
 class KidsBritannicaDataSet:
     @staticmethod
-    def download(size='small', data_dir='data', quiet=False, download_media=False, overwrite=False):
+    def download(size='small', data_dir='data', quiet=False, download_media=False, overwrite=False, extract=True):
         
         data_dir = Path(data_dir)
         os.makedirs(data_dir, exist_ok=True)
@@ -54,7 +87,12 @@ class KidsBritannicaDataSet:
         
         output_dir = article_output.parent
         articles_dir = output_dir / 'articles'
-        if not articles_dir.exists() or overwrite:
+        if not extract:
+            # articles are served straight from the archive, see `ArticleArchive`
+            download_zip(article_url, article_output, overwrite=overwrite)
+            if download_media and media_url:
+                download_and_unzip(media_url, media_output)
+        elif not articles_dir.exists() or overwrite:
             download_and_unzip(article_url, article_output)
             if download_media and media_url:
                 download_and_unzip(media_url, media_output)
@@ -62,7 +100,8 @@ class KidsBritannicaDataSet:
         return output_dir
         
         
-    def __init__(self, data_dir='data/kbds_small'):
+    def __init__(self, data_dir='data/kbds_small', use_archive=None, cache_size=None, cache_bytes=None,
+                 async_workers=None):
         data_dir = Path(data_dir)
         if not data_dir.exists():
             stem  = data_dir.stem
@@ -72,40 +111,274 @@ class KidsBritannicaDataSet:
                 size = 'aligned'
             else:
                 size = 'full'
-            KidsBritannicaDataSet.download(size, data_dir.parent)
+            KidsBritannicaDataSet.download(size, data_dir.parent, extract=use_archive is False)
         self.data_dir = data_dir
         self.articles_dir = self.data_dir / 'articles'
         self.media_dir = self.data_dir / 'media'
-        self.kids_article_paths = KidsBritannicaDataSet.get_article_paths(self.data_dir, tier='kids')
-        self.students_article_paths = KidsBritannicaDataSet.get_article_paths(self.data_dir, tier='students')
-        self.scholars_article_paths = KidsBritannicaDataSet.get_article_paths(self.data_dir, tier='scholars')
+        # read from the zip when it hasn't been extracted (or when asked to)
+        self.archive = None
+        archive_path = find_article_archive(self.data_dir)
+        if use_archive is None:
+            use_archive = archive_path is not None and not self.articles_dir.exists()
+        if use_archive:
+            if archive_path is None:
+                raise ValueError(f"No article archive could be found in {str(self.data_dir)}.")
+            self.archive = ArticleArchive(archive_path)
+        elif not self.articles_dir.exists():
+            raise ValueError(f"No articles could not be found in {str(self.data_dir)}. Please download the data first.")
+        # tier listings and path lists are discovered on first use, see
+        # `tier_filenames` and `tier_paths`
+        self._tier_filenames = {}
+        self._tier_paths = {}
+        # `ArticleView`s over the tier paths, see `tier_view`
+        self._tier_views = {}
+        self.manifest_filepath = self.data_dir / 'article_manifest.json'
+        # `article_by_id` keeps up to `cache_size` articles / `cache_bytes` of JSON in memory
+        self.cache = None
+        if cache_size or cache_bytes:
+            self.cache = ArticleCache(max_entries=cache_size, max_bytes=cache_bytes)
         self.metadata_filepath = self.data_dir / 'metadata.json'
-        if self.metadata_filepath.exists():
-            print('Loading metadata from file...')
-            self._metadata = json.load(open(self.metadata_filepath, 'rt'))
+        self.metadata_stamps_filepath = self.data_dir / 'metadata_stamps.json'
+        # memory-mapped mirror of metadata.json, see `MetadataStore.save`
+        self.metadata_binary_filepath = self.data_dir / 'metadata.bin'
+        # `aget` & co. read on a pool of at most `async_workers` threads
+        self.async_workers = async_workers
+        self._async_executor = None
     
-    @staticmethod
-    def get_article_paths(data_dir, tier='*'):
-        article_paths = glob(str(data_dir / 'articles' / tier / '*.json'))
-        if len(article_paths) == 0:
-            raise ValueError(f"No articles could not be found in {str(data_dir)}. Please download the data first.")
-        return article_paths
+    def scan_article_paths(self):
+        """Forgets the discovered article paths so they are re-listed on next use."""
+        if self.archive is not None and self.archive.is_stale():
+            self.archive.close()
+            self.archive = ArticleArchive(self.archive.zip_path)
+        self._tier_filenames = {}
+        self._tier_paths = {}
+        self._tier_views = {}
+        if hasattr(self, '_article_index'):
+            del self._article_index
+
+    def get_tier_paths(self, tier):
+        if self.archive is not None:
+            return self.archive.article_paths(tier)
+        tier_dir = os.path.join(self.articles_dir, tier)
+        return [os.path.join(tier_dir, filename) for filename in self.tier_filenames(tier).values()]
+
+    def tier_paths(self, tier):
+        if tier not in self._tier_paths:
+            self._tier_paths[tier] = self.get_tier_paths(tier)
+        return self._tier_paths[tier]
+
+    @property
+    def kids_article_paths(self):
+        return self.tier_paths('kids')
+
+    @property
+    def students_article_paths(self):
+        return self.tier_paths('students')
+
+    @property
+    def scholars_article_paths(self):
+        return self.tier_paths('scholars')
+
+    def tier_mtime(self, tier):
+        try:
+            return (self.articles_dir / tier).stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def read_manifest(self):
+        if self.manifest_filepath.exists():
+            return read_json(self.manifest_filepath)
+        return {}
+
+    def tier_filenames(self, tier):
+        """Maps the id of every article file of `tier` to its filename, in
+        filename order.
+
+        The listing is cached in `article_manifest_<tier>.json` and only
+        redone (with `os.scandir`) when the tier directory's mtime changes,
+        i.e. when articles are added, removed or renamed. The manifest is
+        only a cache: if it can't be written (e.g. on a read-only mount),
+        the fresh listing is used as is.
+        """
+        if tier not in self._tier_filenames:
+            self._tier_filenames[tier] = self.read_tier_filenames(tier)
+        return self._tier_filenames[tier]
+
+    def read_tier_filenames(self, tier):
+        mtime = self.tier_mtime(tier)
+        manifest = self.read_manifest()
+        listing_filepath = self.data_dir / f'article_manifest_{tier}.json'
+        entry = manifest.get(tier)
+        if entry is not None and entry['mtime'] == mtime and listing_filepath.exists():
+            filenames = read_json(listing_filepath)
+            # listings written before the ids were stored are plain lists
+            if isinstance(filenames, dict):
+                return filenames
+        filenames = {}
+        if mtime is not None:
+            with os.scandir(self.articles_dir / tier) as it:
+                for name in sorted(e.name for e in it if e.name.endswith('.json') and e.is_file()):
+                    filenames[name.split(' ', 1)[0]] = name
+        try:
+            write_json(listing_filepath, filenames)
+            manifest[tier] = {'mtime': mtime, 'count': len(filenames)}
+            write_json(self.manifest_filepath, manifest)
+        except OSError:
+            pass
+        return filenames
+
+    def article_count(self, tier='*'):
+        """Number of articles in `tier` (all tiers for '*'), without listing
+        the directory when the manifest is current."""
+        if tier == '*':
+            return sum(self.article_count(tier) for tier in ['kids', 'students', 'scholars'])
+        if tier in self._tier_paths or self.archive is not None:
+            return len(self.tier_paths(tier))
+        entry = self.read_manifest().get(tier)
+        if entry is not None and entry['mtime'] == self.tier_mtime(tier):
+            return entry['count']
+        return len(self.tier_filenames(tier))
+
+    def load_article(self, path, fields=None):
+        if self.archive is not None:
+            return self.archive.read(path, fields)
+        return Article(path, fields)
     
-    def article_by_id(self, article_id):
-        md = self.metadata[article_id]
-        filename = f"{md['id']} {md['title']}.json"
-        filename = sanitize_filename(filename)
-        article_path = self.articles_dir / md['tier'] / filename
-        return Article(article_path)
+    @property
+    def article_index(self):
+        """Maps every article id to the path (or archive member) it is stored at."""
+        if not hasattr(self, '_article_index'):
+            if self.archive is not None:
+                self._article_index = self.archive.id_to_name
+            else:
+                self._article_index = {}
+                for tier in ['kids', 'students', 'scholars']:
+                    tier_dir = os.path.join(self.articles_dir, tier)
+                    self._article_index.update((article_id, os.path.join(tier_dir, filename))
+                                               for article_id, filename in self.tier_filenames(tier).items())
+        return self._article_index
+
+    def article_path(self, article_id):
+        """The path (or archive member) `article_id` is stored at, or None.
+
+        Unlike `article_index`, this only looks the id up in the tier
+        listings (or the archive's sorted name table), so a single lookup
+        doesn't build a path for every article.
+        """
+        if hasattr(self, '_article_index'):
+            return self._article_index.get(article_id)
+        if self.archive is not None:
+            return self.archive.name_of(article_id)
+        for tier in ['kids', 'students', 'scholars']:
+            filename = self.tier_filenames(tier).get(article_id)
+            if filename is not None:
+                return os.path.join(self.articles_dir, tier, filename)
+        return None
+
+    def article_stamp(self, path):
+        if self.archive is not None:
+            return self.archive.stamp(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def article_by_id(self, article_id, fields=None):
+        path = self.article_path(article_id)
+        if path is None:
+            raise KeyError(article_id)
+        return self.load_cached(article_id, path, fields)
+
+    def load_cached(self, article_id, path, fields=None):
+        """`load_article` through the article cache, if there is one."""
+        if self.cache is None:
+            return self.load_article(path, fields)
+        key = (article_id, tuple(fields) if fields is not None else None)
+        stamp = self.article_stamp(path)
+        article = self.cache.get(key, stamp)
+        if article is None:
+            article = self.load_article(path, fields)
+            if article is not None and stamp is not None:
+                self.cache.put(key, stamp, article, stamp[1])
+        return article
+
+    @property
+    def async_executor(self):
+        if self._async_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._async_executor = ThreadPoolExecutor(self.async_workers)
+        return self._async_executor
+
+    async def aget(self, article_id, fields=None):
+        """Async `article_by_id`: the article is read on `async_executor`, so
+        the event loop is never blocked, and goes through the same cache."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.async_executor, self.article_by_id, article_id, fields)
+
+    async def aget_many(self, article_ids, fields=None):
+        """The articles with `article_ids`, in order (KeyError for unknown ids).
+
+        At most `async_workers` articles are read at a time; the rest wait
+        their turn on the executor's queue."""
+        return await asyncio.gather(*(self.aget(article_id, fields) for article_id in article_ids))
+
+    async def aiter(self, tier='*', fields=None, prefetch=None):
+        """Async iterator over the articles of `tier`, in `iter_articles` order.
+
+        Up to `prefetch` articles (`async_workers`, or 32, by default) are
+        read ahead while the consumer awaits; like `aget`, reads go through
+        the article cache."""
+        paths = self.tier_view(tier).keys
+        if prefetch is None:
+            prefetch = self.async_workers or 32
+        loop = asyncio.get_running_loop()
+        pending = deque()
+        try:
+            for path in paths:
+                article_id = os.path.basename(path).split(' ', 1)[0]
+                pending.append(loop.run_in_executor(self.async_executor, self.load_cached,
+                                                    article_id, path, fields))
+                if len(pending) >= prefetch:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def iter_articles(self, tier='*', fields=None):
+        """The articles of `tier` (all tiers for '*'), as an `ArticleView`.
+
+        `fields` restricts each article to those keys, e.g. `['id', 'title']`;
+        the rest of the document (notably `text`) is skipped when possible.
+        """
+        view = self.tier_view(tier)
+        if fields is None:
+            return view
+        return ArticleView(view.keys, lambda path: self.load_article(path, fields))
+
+    def tier_view(self, tier='*'):
+        """The `ArticleView` of `tier`, built once per listing of the paths."""
+        if tier not in self._tier_views:
+            tiers = ['kids', 'students', 'scholars'] if tier == '*' else [tier]
+            paths = [path for tier in tiers for path in self.tier_paths(tier)]
+            self._tier_views[tier] = ArticleView(paths, self.load_article)
+        return self._tier_views[tier]
+
+    def __len__(self):
+        return self.article_count()
+
+    def __getitem__(self, i):
+        return self.articles[i]
+
+    def shard(self, index, count):
+        """The `index`-th of `count` disjoint shards of all articles, see `ArticleView.shard`."""
+        return self.articles.shard(index, count)
     
     @property
     def articles(self):
-        for article in self.kids_articles:
-            yield article
-        for article in self.students_articles:
-            yield article
-        for article in self.scholars_articles:
-            yield article
+        return self.iter_articles()
 
     @property
     def article_paths(self):
@@ -118,128 +391,261 @@ class KidsBritannicaDataSet:
     
     @property
     def kids_articles(self):
-        for json_path in self.kids_article_paths:
-            yield Article(json_path)
+        return self.iter_articles('kids')
     
     @property
     def students_articles(self):
-        for json_path in self.students_article_paths:
-            yield Article(json_path)
+        return self.iter_articles('students')
     
     @property
     def scholars_articles(self):
-        for json_path in self.scholars_article_paths:
-            yield Article(json_path)
+        return self.iter_articles('scholars')
             
     @property
     def aligned_triple_ids(self):
-        seen = set()
-        for article_id, md in self.metadata.items():
-            if md['tier'] == 'kids':
-                tier_to_id = {**md['aligned_ids'], **{md['tier']: article_id}}
-                if len(tier_to_id) == 3 and article_id not in seen:
-                    triple = (tier_to_id['kids'], tier_to_id['students'], tier_to_id['scholars'])
-                    seen.update(triple)
-                    yield triple
-        
+        yield from self.metadata.triple_ids()
+
+    @property
+    def aligned_count(self):
+        return self.metadata.n_triples()
+
+    def aligned_ids_of(self, article_id):
+        """The (kids, students, scholars) ids `article_id` is aligned with, or None."""
+        return self.metadata.triple_of(article_id)
+
+    def aligned_version(self, article_id, tier):
+        """The `tier` version of the article `article_id`, e.g. the scholars
+        version of a kids article, or None if it isn't aligned."""
+        triple = self.aligned_ids_of(article_id)
+        if triple is None:
+            return None
+        version_id = triple[['kids', 'students', 'scholars'].index(tier)]
+        if self.article_path(version_id) is None:
+            return None
+        return self.article_by_id(version_id)
+
+    def load_triple(self, ids):
+        return tuple(self.article_by_id(id_) if id_ in self.metadata else None
+                     for id_ in ids)
+
     @property
     def aligned_triples(self):
-        for ids in self.aligned_triple_ids:
-            yield tuple(self.article_by_id(id_) if id_ in self.metadata else None
-                        for id_ in ids)
+        return ArticleView(self.metadata.triple_ids(), self.load_triple)
     
     @property
     def kids_aligned(self):
-        for kids_id, _, _ in self.aligned_triple_ids:
-            if kids_id in self.metadata:
-                yield self.article_by_id(kids_id)
+        return ArticleView(self.metadata.aligned_tier_ids('kids'), self.article_by_id)
     
     @property
     def students_aligned(self):
-        for _, student_id, _ in self.aligned_triple_ids:
-            if student_id in self.metadata:
-                yield self.article_by_id(student_id)
+        return ArticleView(self.metadata.aligned_tier_ids('students'), self.article_by_id)
     
     @property
     def scholars_aligned(self):
-        for _, _, scholars_id in self.aligned_triple_ids:
-            if scholars_id in self.metadata:
-                yield self.article_by_id(scholars_id)
+        return ArticleView(self.metadata.aligned_tier_ids('scholars'), self.article_by_id)
     
     @property
     def aligned(self):
-        for kids_id, scholars_id, students_id in self.aligned_triple_ids:
-            yield self.article_by_id(kids_id)
-            yield self.article_by_id(scholars_id)
-            yield self.article_by_id(students_id)
+        return ArticleView(self.metadata.aligned_article_ids(), self.article_by_id)
     
+    def build_metadata(self, workers=None, chunk_size=1000, article_paths=None):
+        """Reads the metadata keys of every article (or of `article_paths`) on a
+        pool of `workers` processes (one per CPU by default), `chunk_size`
+        articles at a time."""
+        if article_paths is None:
+            article_paths = list(self.article_paths)
+        chunks = list(get_chunks(article_paths, chunk_size))
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = min(workers, len(chunks))
+        if workers <= 1:
+            zipfile = self.archive.zipfile if self.archive is not None else None
+            results = (_read_metadata_chunk(chunk, zipfile) for chunk in chunks)
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            archive_path = str(self.archive.zip_path) if self.archive is not None else None
+            executor = ProcessPoolExecutor(workers, initializer=_init_metadata_worker,
+                                           initargs=(archive_path, utils.json_reader.backend))
+            results = executor.map(_read_metadata_chunk, chunks)
+        metadata = {}
+        try:
+            for chunk in results:
+                for md in chunk:
+                    metadata[md['id']] = md
+        finally:
+            if workers > 1:
+                executor.shutdown()
+        return metadata
+
     @property
     def metadata(self):
         if not hasattr(self, '_metadata'):
             if self.metadata_filepath.exists():
-                print('Loading metadata from file...')
-                self._metadata = json.load(open(self.metadata_filepath, 'rt'))
+                st = self.metadata_filepath.stat()
+                self._metadata = MetadataStore.load(self.metadata_binary_filepath,
+                                                    (st.st_mtime_ns, st.st_size))
+                if self._metadata is None:
+                    print('Loading metadata from file...')
+                    self._metadata = MetadataStore.from_dict(read_json(self.metadata_filepath))
+                    self.save_metadata_binary((st.st_mtime_ns, st.st_size))
             else:
                 print("Building metadata from scratch...")
                 print("This could take several minutes.")
-                metadata_keys = ['id', 'url', 'tier', 'title', 'aligned_ids', 'aligned_urls']
-                self._metadata = {}
-                for article, article_path in zip(self.articles, self.article_paths):
-                    article_metadata = {}
-                    for key in metadata_keys:
-                        if key in article:
-                            article_metadata[key] = article[key]
-                    article_metadata['path'] = article_path
-                    
-                    self._metadata[article_metadata['id']] = article_metadata
+                stamps = self.metadata_stamps()
+                metadata = self.build_metadata()
                 print('Writing metadata to file...')
-                write_json(self.metadata_filepath, self._metadata)
+                self.write_metadata(metadata, stamps)
         return self._metadata
+
+    def write_metadata(self, metadata, stamps):
+        write_json(self.metadata_filepath, metadata)
+        write_json(self.metadata_stamps_filepath, stamps)
+        st = self.metadata_filepath.stat()
+        self._metadata = MetadataStore.from_dict(metadata)
+        self.save_metadata_binary((st.st_mtime_ns, st.st_size))
+
+    def save_metadata_binary(self, stamp):
+        # metadata.bin is only a cache of metadata.json: if it can't be
+        # written (e.g. on a read-only mount) keep using the in-memory store
+        try:
+            self._metadata.save(self.metadata_binary_filepath, stamp)
+        except OSError:
+            pass
+
+    def metadata_stamps(self):
+        """Maps every article path to its (mtime, size), or (CRC, size) in an archive."""
+        stamps = {}
+        for article_path in self.article_paths:
+            stamp = self.article_stamp(article_path)
+            if stamp is not None:
+                stamps[article_path] = list(stamp)
+        return stamps
+
+    def refresh_metadata(self, workers=None):
+        """Brings `metadata.json` up to date with the articles on disk.
+
+        The tier directories are rescanned and only new or changed articles
+        (by size and mtime) are re-read; deleted articles are dropped.
+        Returns the number of added, updated and removed articles.
+        """
+        self.scan_article_paths()
+        old_metadata = self.metadata
+        old_stamps = {}
+        if self.metadata_stamps_filepath.exists():
+            old_stamps = read_json(self.metadata_stamps_filepath)
+        stamps = self.metadata_stamps()
+        changed = [path for path, stamp in stamps.items() if old_stamps.get(path) != stamp]
+        by_path = {md['path']: md for md in old_metadata.values()}
+        by_path.update((md['path'], md) for md in self.build_metadata(workers, article_paths=changed).values())
+        metadata = {}
+        for article_path in self.article_paths:
+            md = by_path.get(article_path)
+            if md is not None:
+                metadata[md['id']] = md
+        counts = {
+            'added': len(metadata.keys() - old_metadata.keys()),
+            'updated': len([path for path in changed if path in old_stamps]),
+            'removed': len(old_metadata.keys() - metadata.keys()),
+        }
+        print(f"Refreshed metadata: {counts['added']} added, {counts['updated']} updated, {counts['removed']} removed")
+        self.write_metadata(metadata, stamps)
+        return counts
     
+    def partial_statistics(self, tier, index=0, count=1, profile='full', limit=None,
+                           batch_size=256, n_process=1, nlp=None):
+        """Computes the `PartialStatistics` of the `index`-th of `count` shards
+        of `tier`'s articles (see `ArticleView.shard`), e.g. on one of `count`
+        machines; `merge_statistics` combines them.
+
+        `profile` is 'fast' (token, sentence and paragraph counts only),
+        'standard' (+ parse heights and noun phrases) or 'full' (+ entities).
+        Paragraphs are streamed through spaCy in batches of `batch_size` on
+        `n_process` processes.
+        """
+        from .statistics import partial_statistics
+        articles = self.iter_articles(tier).shard(index, count)
+        return partial_statistics(articles, limit=limit, profile=profile, nlp=nlp,
+                                  batch_size=batch_size, n_process=n_process)
+
+    def merge_statistics(self, tier_partials):
+        """Merges the `PartialStatistics` of each tier given (a dict of tier to
+        an iterable of partials) and returns the resulting statistics and
+        structures. These replace the given tiers' entries in `stats.json`;
+        the other tiers' entries are kept.
+
+        The partials can come in any order, e.g. one per `shard`, which
+        interleaves the articles: the statistics don't depend on it. The
+        partials themselves are left unchanged."""
+        from .statistics import PartialStatistics
+        stats_path = self.data_dir / 'stats.json'
+        stats, structures = read_json(stats_path) if stats_path.exists() else ({}, {})
+        for tier, partials in tier_partials.items():
+            partials = list(partials)
+            if not partials:
+                raise ValueError(f'No partial statistics to merge for tier {tier}.')
+            merged = PartialStatistics(partials[0].profile)
+            for partial in partials:
+                merged.merge(partial)
+            stats[tier], structures[tier] = merged.finalize()
+        write_json(stats_path, [stats, structures])
+        self._statistics = stats
+        self._structures = structures
+        return stats, structures
+
+    def build_statistics(self, profile='full', limit=None, batch_size=256, n_process=1,
+                         tiers=['kids', 'students', 'scholars']):
+        """Computes the statistics and structures of `tiers` in this process
+        (see `partial_statistics`) and writes them to `stats.json`."""
+        from .statistics import load_pipeline
+        nlp = load_pipeline(profile)
+        return self.merge_statistics({
+            tier: [self.partial_statistics(tier, profile=profile, limit=limit, batch_size=batch_size,
+                                           n_process=n_process, nlp=nlp)]
+            for tier in tiers
+        })
+
+    def load_statistics(self):
+        stats_path = self.data_dir / 'stats.json'
+        stats, structures = {}, {}
+        if stats_path.exists():
+            print('Loading stats from file...')
+            stats, structures = read_json(stats_path)
+        # e.g. when only some tiers were merged with `merge_statistics`
+        missing = [tier for tier in ['kids', 'students', 'scholars'] if tier not in stats]
+        if missing:
+            print('Building stats from scratch...')
+            stats, structures = self.build_statistics(tiers=missing)
+        self._statistics = stats
+        self._structures = structures
+
     @property
     def statistics(self):
-        from .statistics import aggregate_statistics
         if not hasattr(self, '_statistics'):
-            stats_path = self.data_dir / 'stats.json'
-            if stats_path.exists():
-                print('Loading stats from file...')
-                stats, structures = json.load(open(stats_path, 'rt'))
-            else:
-                print('Building stats from scratch...')
-                stats = {}
-                structures = {}
-                limit = None
-                for tier, articles in zip(['kids', 'students', 'scholars'],
-                                        [self.kids_articles, self.students_articles, self.scholars_articles]):
-                    stats[tier], structures[tier] = aggregate_statistics(articles, limit=limit)
-                write_json(stats_path, [stats, structures])
-            self._statistics = stats
-            self._structures = structures
+            self.load_statistics()
         return self._statistics
 
     @property
     def structures(self):
-        from .statistics import aggregate_statistics
         if not hasattr(self, '_structures'):
-            stats_path = self.data_dir / 'stats.json'
-            if stats_path.exists():
-                print('Loading stats from file...')
-                stats, structures = json.load(open(stats_path, 'rt'))
-            else:
-                print('Building stats from scratch...')
-                stats = {}
-                structures = {}
-                limit = None
-                for tier, articles in zip(['kids', 'students', 'scholars'],
-                                        [self.kids_articles, self.students_articles, self.scholars_articles]):
-                    stats[tier], structures[tier] = aggregate_statistics(articles, limit=limit)
-                write_json(stats_path, [stats, structures])
-            self._statistics = stats
-            self._structures = structures
+            self.load_statistics()
         return self._structures
     
-    def copy_subset(self, article_ids, new_data_dir='data/kbds_aligned'):
+    def copy_subset(self, article_ids, new_data_dir='data/kbds_aligned', archive=False, workers=None):
         new_data_dir = Path(new_data_dir)
+        if archive:
+            # write a `<name>_articles.zip` that `KidsBritannicaDataSet` can read directly
+            from .zipfile2 import ZipFile, ZIP_DEFLATED
+            os.makedirs(new_data_dir, exist_ok=True)
+            zip_path = new_data_dir / f'{new_data_dir.name}_articles.zip'
+            def members():
+                for article_id in article_ids:
+                    article = self.article_by_id(article_id)
+                    filename = sanitize_filename(f"{article['id']} {article['title']}.json")
+                    yield f"articles/{article['tier']}/{filename}", json.dumps(article)
+            with ZipFile(str(zip_path), 'w', ZIP_DEFLATED) as zf:
+                zf.writestrs(members(), workers=workers)
+            print(f'Wrote {len(article_ids)} articles to {str(zip_path)}')
+            return
         make_directories(new_data_dir)
         article_dir = new_data_dir / 'articles'
         for article_id in article_ids:
@@ -256,5 +662,6 @@ class KidsBritannicaDataSet:
             for media in article['media']:
                 if media['data'] and media['media-type'] in types:
                     media_fp = self.media_dir / article['tier'] / sanitize_filename(f"{article['id']} {article['title']}") / f"{media['id']}.{media['data']['file-type']}"
-                    media['filepath'] = str(media_fp)
+                    # copy: the article may be shared through the article cache
+                    media = dict(media, filepath=str(media_fp))
                     yield media
\ No newline at end of file
@@ -3,14 +3,17 @@ import json
 import shutil
 import logging
 import time
+import threading
+import asyncio
 import sys
+import re
 import subprocess
 import traceback
 import random as rand
 import unicodedata, string
 from pathlib import Path
 from glob2 import glob
-from collections import defaultdict
+from collections import defaultdict, deque
 from jsonextended import edict, plugins, example_mockpaths
 from string import ascii_lowercase
 from pprint import pprint
\ No newline at end of file
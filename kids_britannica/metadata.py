@@ -0,0 +1,342 @@
+from .imports import *
+import mmap
+import struct
+from array import array
+from collections.abc import Mapping, ItemsView, ValuesView
+
+
+TIERS = ['kids', 'students', 'scholars']
+
+class StringTable:
+    """Immutable list of strings stored as one UTF-8 blob plus offsets."""
+
+    def __init__(self, blob=b'', offsets=None):
+        self.blob = blob
+        self.offsets = offsets if offsets is not None else array('I', [0])
+
+    @classmethod
+    def build(cls, strings):
+        offsets = array('I', [0])
+        parts = []
+        for s in strings:
+            encoded = s.encode('utf-8')
+            parts.append(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+        return cls(b''.join(parts), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        # `blob` may be bytes or a memoryview into a mapped file
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+# `metadata.bin`: a header, then one (offset, size) pair per section, then the
+# sections (string offsets, string blob, columns, id order), 8-byte aligned
+BINARY_MAGIC = b'KBMD0002'
+BINARY_HEADER = struct.Struct('<8s1sqqI')
+BINARY_SECTION = struct.Struct('<QQ')
+
+class MetadataStore(Mapping):
+    """Compact, columnar, read-only form of the metadata mapping.
+
+    Every string (ids, titles, urls, paths) is interned once in a shared
+    `StringTable`; each article is a row of integer columns referencing it,
+    with alignment stored as string indexes per tier (-1 when absent).
+    `store[article_id]` rebuilds the same dict `metadata.json` holds.
+
+    The aligned (kids, students, scholars) triples are precomputed as three
+    columns of string indexes (`triples`), and the `triple` column gives the
+    triple each article belongs to (-1 when none).
+    """
+
+    STRING_COLUMNS = ['id', 'url', 'title', 'path']
+    # bits of the `flags` column
+    HAS_ALIGNED_IDS = 1
+    HAS_ALIGNED_URLS = 2
+
+    def __init__(self, strings, columns, id_order, triples):
+        self.strings = strings
+        self.columns = columns
+        self.id_order = id_order
+        self.triples = triples
+        # id lists derived from `triples`, built on first use
+        self._triple_ids = None
+        self._aligned_article_ids = None
+        self._aligned_tier_ids = {}
+
+    @classmethod
+    def from_dict(cls, metadata):
+        strings = {}
+        def intern(s):
+            if s is None:
+                return -1
+            i = strings.get(s)
+            if i is None:
+                i = strings[s] = len(strings)
+            return i
+        columns = {name: array('i') for name in cls.STRING_COLUMNS}
+        columns['tier'] = array('b')
+        columns['flags'] = array('b')
+        for tier in TIERS:
+            columns[f'aligned_id_{tier}'] = array('i')
+            columns[f'aligned_url_{tier}'] = array('i')
+        for md in metadata.values():
+            for name in cls.STRING_COLUMNS:
+                columns[name].append(intern(md.get(name)))
+            columns['tier'].append(TIERS.index(md['tier']) if md.get('tier') in TIERS else -1)
+            flags = 0
+            if 'aligned_ids' in md:
+                flags |= cls.HAS_ALIGNED_IDS
+            if 'aligned_urls' in md:
+                flags |= cls.HAS_ALIGNED_URLS
+            columns['flags'].append(flags)
+            aligned_ids = md.get('aligned_ids') or {}
+            aligned_urls = md.get('aligned_urls') or {}
+            for tier in TIERS:
+                columns[f'aligned_id_{tier}'].append(intern(aligned_ids.get(tier)))
+                columns[f'aligned_url_{tier}'].append(intern(aligned_urls.get(tier)))
+        ids = columns['id']
+        id_strings = list(strings)
+        id_order = array('i', sorted(range(len(ids)), key=lambda row: id_strings[ids[row]]))
+        # a triple per kids article aligned with both other tiers
+        id_to_row = {id_strings[i]: row for row, i in enumerate(ids) if i >= 0}
+        triples = {tier: array('i') for tier in TIERS}
+        columns['triple'] = array('i', [-1]) * len(ids)
+        seen = set()
+        for article_id, md in metadata.items():
+            if md.get('tier') == 'kids':
+                tier_to_id = {**md.get('aligned_ids', {}), **{'kids': article_id}}
+                if len(tier_to_id) == 3 and all(tier in tier_to_id for tier in TIERS) and article_id not in seen:
+                    triple = [tier_to_id[tier] for tier in TIERS]
+                    seen.update(triple)
+                    for tier, id_ in zip(TIERS, triple):
+                        triples[tier].append(intern(id_))
+                        row = id_to_row.get(id_)
+                        if row is not None:
+                            columns['triple'][row] = len(triples['kids']) - 1
+        return cls(StringTable.build(strings), columns, id_order, triples)
+
+    @staticmethod
+    def section_typecodes():
+        """Typecode of every array section of `metadata.bin`, in file order."""
+        typecodes = {'string_offsets': 'I', 'strings': 'B'}
+        for name in MetadataStore.STRING_COLUMNS:
+            typecodes[name] = 'i'
+        typecodes['tier'] = 'b'
+        typecodes['flags'] = 'b'
+        for tier in TIERS:
+            typecodes[f'aligned_id_{tier}'] = 'i'
+            typecodes[f'aligned_url_{tier}'] = 'i'
+        typecodes['triple'] = 'i'
+        typecodes['id_order'] = 'i'
+        for tier in TIERS:
+            typecodes[f'triple_{tier}'] = 'i'
+        return typecodes
+
+    def sections(self):
+        sections = {'string_offsets': self.strings.offsets, 'strings': self.strings.blob}
+        sections.update(self.columns)
+        sections['id_order'] = self.id_order
+        for tier in TIERS:
+            sections[f'triple_{tier}'] = self.triples[tier]
+        return sections
+
+    def save(self, path, stamp):
+        """Writes the store to `path` in the binary form `load` maps back;
+        `stamp` is the (mtime, size) of the `metadata.json` it mirrors."""
+        typecodes = self.section_typecodes()
+        sections = self.sections()
+        sections = [bytes(sections[name]) if typecode == 'B' else array(typecode, sections[name]).tobytes()
+                    for name, typecode in typecodes.items()]
+        byteorder = b'<' if sys.byteorder == 'little' else b'>'
+        header = BINARY_HEADER.pack(BINARY_MAGIC, byteorder, stamp[0], stamp[1], len(sections))
+        pos = len(header) + BINARY_SECTION.size * len(sections)
+        table = []
+        for section in sections:
+            pos += -pos % 8
+            table.append(BINARY_SECTION.pack(pos, len(section)))
+            pos += len(section)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(header)
+                f.write(b''.join(table))
+                for entry, section in zip(table, sections):
+                    start, _ = BINARY_SECTION.unpack(entry)
+                    f.write(b'\0' * (start - f.tell()))
+                    f.write(section)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path, stamp):
+        """Memory-maps a store written by `save`, or returns None if there is
+        none for a `metadata.json` with this (mtime, size)."""
+        try:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        byteorder = b'<' if sys.byteorder == 'little' else b'>'
+        typecodes = cls.section_typecodes()
+        table_end = BINARY_HEADER.size + len(typecodes) * BINARY_SECTION.size
+        if len(mm) < table_end:
+            mm.close()
+            return None
+        magic, order, mtime, size, n_sections = BINARY_HEADER.unpack_from(mm, 0)
+        if (magic != BINARY_MAGIC or order != byteorder or (mtime, size) != tuple(stamp)
+                or n_sections != len(typecodes)):
+            mm.close()
+            return None
+        bounds = []
+        for k, typecode in enumerate(typecodes.values()):
+            start, nbytes = BINARY_SECTION.unpack_from(mm, BINARY_HEADER.size + k * BINARY_SECTION.size)
+            # a truncated or overwritten file must be rebuilt, not served as empty columns
+            if start < table_end or start + nbytes > len(mm) or nbytes % array(typecode).itemsize:
+                mm.close()
+                return None
+            bounds.append((start, nbytes))
+        view = memoryview(mm)
+        sections = {}
+        for (name, typecode), (start, nbytes) in zip(typecodes.items(), bounds):
+            sections[name] = view[start:start + nbytes].cast(typecode)
+        strings = StringTable(sections.pop('strings'), sections.pop('string_offsets'))
+        id_order = sections.pop('id_order')
+        triples = {tier: sections.pop(f'triple_{tier}') for tier in TIERS}
+        return cls(strings, sections, id_order, triples)
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+    def string(self, i):
+        return self.strings[i] if i >= 0 else None
+
+    def article_id(self, row):
+        return self.strings[self.columns['id'][row]]
+
+    def row(self, article_id):
+        """Returns the row of `article_id`, or -1."""
+        id_order = self.id_order
+        lo, hi = 0, len(id_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.article_id(id_order[mid]) < article_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(id_order) and self.article_id(id_order[lo]) == article_id:
+            return id_order[lo]
+        return -1
+
+    def n_triples(self):
+        return len(self.triples['kids'])
+
+    def triple(self, k):
+        """The k-th aligned (kids, students, scholars) id triple."""
+        return tuple(self.strings[self.triples[tier][k]] for tier in TIERS)
+
+    def triple_ids(self):
+        """All aligned id triples, in order."""
+        if self._triple_ids is None:
+            self._triple_ids = [self.triple(k) for k in range(self.n_triples())]
+        return self._triple_ids
+
+    def aligned_article_ids(self):
+        """The ids of every aligned triple, flattened in triple order."""
+        if self._aligned_article_ids is None:
+            self._aligned_article_ids = [id_ for triple in self.triple_ids() for id_ in triple]
+        return self._aligned_article_ids
+
+    def aligned_tier_ids(self, tier):
+        """The ids of the aligned articles of `tier` that are in the store, in
+        triple order."""
+        if tier not in self._aligned_tier_ids:
+            # rows point at their triple, so the ids present are found in one
+            # pass over the rows instead of one lookup per triple
+            column = self.triples[tier]
+            present = bytearray(len(column))
+            ids = self.columns['id']
+            for row, k in enumerate(self.columns['triple']):
+                if k >= 0 and ids[row] == column[k]:
+                    present[k] = 1
+            self._aligned_tier_ids[tier] = [self.strings[column[k]]
+                                            for k in range(len(column)) if present[k]]
+        return self._aligned_tier_ids[tier]
+
+    def triple_of(self, article_id):
+        """The aligned triple `article_id` belongs to, or None."""
+        row = self.row(article_id)
+        if row < 0 or self.columns['triple'][row] < 0:
+            return None
+        return self.triple(self.columns['triple'][row])
+
+    def tier(self, row):
+        code = self.columns['tier'][row]
+        return TIERS[code] if code >= 0 else None
+
+    def aligned_ids(self, row):
+        aligned = {}
+        for tier in TIERS:
+            i = self.columns[f'aligned_id_{tier}'][row]
+            if i >= 0:
+                aligned[tier] = self.strings[i]
+        return aligned
+
+    def row_dict(self, row):
+        columns = self.columns
+        md = {}
+        for name in ['id', 'url', 'tier', 'title']:
+            value = self.tier(row) if name == 'tier' else self.string(columns[name][row])
+            if value is not None:
+                md[name] = value
+        flags = columns['flags'][row]
+        if flags & self.HAS_ALIGNED_IDS:
+            md['aligned_ids'] = self.aligned_ids(row)
+        if flags & self.HAS_ALIGNED_URLS:
+            md['aligned_urls'] = {tier: self.strings[i] for tier in TIERS
+                                  for i in [columns[f'aligned_url_{tier}'][row]] if i >= 0}
+        path = self.string(columns['path'][row])
+        if path is not None:
+            md['path'] = path
+        return md
+
+    def __getitem__(self, article_id):
+        row = self.row(article_id)
+        if row < 0:
+            raise KeyError(article_id)
+        return self.row_dict(row)
+
+    def __contains__(self, article_id):
+        return self.row(article_id) >= 0
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.article_id(row)
+
+    def items(self):
+        return MetadataItemsView(self)
+
+    def values(self):
+        return MetadataValuesView(self)
+
+    def to_dict(self):
+        return dict(self.items())
+
+# views that walk the rows in order instead of looking every id up again
+class MetadataItemsView(ItemsView):
+    def __iter__(self):
+        store = self._mapping
+        for row in range(len(store)):
+            yield store.article_id(row), store.row_dict(row)
+
+class MetadataValuesView(ValuesView):
+    def __iter__(self):
+        store = self._mapping
+        for row in range(len(store)):
+            yield store.row_dict(row)
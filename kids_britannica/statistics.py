@@ -1,96 +1,339 @@
-import nltk
-from nltk import Tree
+import numpy as np
 import spacy
-from collections import defaultdict, Counter
+from spacy.attrs import HEAD
+from collections import defaultdict
 from math import log
 import json
+from .utils import read_json, write_json
 
-def to_nltk_tree(node):
-    if node.n_lefts + node.n_rights > 0:
-        return Tree(node.orth_, [to_nltk_tree(child) for child in node.children])
-    else:
-        return node.orth_
+def get_parse_heights(doc):
+    """Returns the parse tree height of every sentence of `doc`, in order.
 
-def get_sentence_parse_height(sent):
-    tree = to_nltk_tree(sent.root)
-    try:
-        return tree.height()
-    except Exception as e:
-        # Sometimes invalid parses don't successfully become trees
-        return 0
-
-def aggregate_statistics(articles, limit=None):
-    nlp = spacy.load("en_core_web_sm")
-    nltk.download('punkt', quiet=True)
-    ids = []
-    sentence_lengths = []
-    sentence_counts = []
-    parse_heights = []
-    entity_counts = defaultdict(int)
-    entity_count_list = []
-    noun_phrase_counts = []
-    paragraph_counts = []
-    token_counts = defaultdict(int)
-    article_lengths = []
-    i = -1
-    for i, article in enumerate(articles):
-        print(i+1, article['id'], article['title'])
-        ids.append(article['id'])
-        article_length = 0
-        for section_title, section_paragraphs in article['text']:
-            paragraph_counts.append(len(section_paragraphs))
-            for paragraph in section_paragraphs:
-                sentences = list(nlp(paragraph).sents)
-                sentence_counts.append(len(sentences))
-                for sentence in sentences:
-                    sentence_lengths.append(len(sentence))
-                    article_length += len(sentence)
-                    parse_heights.append(get_sentence_parse_height(sentence))
-                    entity_count_list.append(len(sentence.ents))
-                    noun_phrase_counts.append(len(list(sentence.noun_chunks)))
-                    ents = set(sentence.ents)
-                    for ent in ents:
-                        entity_counts[ent] += 1
-                    for token in sentence:
-                        token = str(token).lower()
-                        token_counts[token] += 1
-        article_lengths.append(article_length)
-        if limit and i + 1 >= limit:
+    The height is that of the tree rooted at the sentence's root, counting
+    leaf tokens as 1, i.e. one more than the depth of the deepest token under
+    the root; a root without children counts as 0. Depths are computed for
+    the whole doc at once from its head array by pointer jumping, so no tree
+    objects are built and deep parses need no recursion.
+    """
+    n = len(doc)
+    sentence_roots = [sent.root.i for sent in doc.sents]
+    if n == 0:
+        return [0 for _ in sentence_roots]
+    index = np.arange(n)
+    # `HEAD` holds each token's head as an offset relative to the token
+    ancestor = index + doc.to_array(HEAD).astype(np.int64)
+    depth = (ancestor != index).astype(np.int64)
+    # after k rounds, `ancestor` is 2**k steps up (or the root) and `depth`
+    # counts the steps taken; tokens on a cycle never reach a root
+    for _ in range(n.bit_length() + 1):
+        next_ancestor = ancestor[ancestor]
+        if np.array_equal(next_ancestor, ancestor):
             break
-    n_articles = len(article_lengths)
-    n_tokens = sum(sentence_lengths)
-    n_unique_tokens(len(token_counts))
-    n_sentences = sum(sentence_counts)
-    n_paragraphs = sum(paragraph_counts)
-    n_entities = sum(entity_count_list)
-    n_noun_phrases = sum(noun_phrase_counts)
-    
-    avg_num_sentences = n_sentences / n_articles
-    avg_parse_height = sum(parse_heights) / len(parse_heights)
-    avg_sentence_length = n_tokens / n_sentences
-    avg_paragraph_count = n_paragraphs / n_articles
-    avg_entity_count = n_entities / len(entity_count_list)
-    avg_article_length = sum(article_lengths) / len(article_lengths)
-    avg_noun_phrase_count = sum(noun_phrase_counts) / len(noun_phrase_counts)
-    return {
-        'n_articles': i + 1,
-        'n_tokens': n_tokens,
-        'n_unique_tokens': n_unique_tokens,
-        'n_sentences': n_sentences,
-        'n_paragraphs': n_paragraphs,
-        'n_entities': n_entities,
-        'n_noun_phrases': n_noun_phrases,
-        'avg_paragraphs_per_article': avg_paragraph_count,
-        'avg_sentences_per_article': avg_num_sentences,
-        'avg_tokens_per_article': avg_article_length,
-        'avg_sentence_parse_height': avg_parse_height,
-        'avg_entities_per_sentence': avg_entity_count,
-        'avg_noun_phrases_per_sentence': avg_noun_phrase_count
-    }, {
-        'sentence_lengths': sentence_lengths,
-        'parse_heights': parse_heights,
-        'entity_count_list': entity_count_list,
-        'parse_height_counts': Counter(parse_heights),
-        'paragraph_counts': paragraph_counts,
-        'token_counts': token_counts,
-    }
\ No newline at end of file
+        depth += depth[ancestor]
+        ancestor = next_ancestor
+    reached = ancestor[ancestor] == ancestor
+    max_depth = np.zeros(n, dtype=np.int64)
+    np.maximum.at(max_depth, ancestor[reached], depth[reached])
+    return [int(max_depth[root]) + 1 if max_depth[root] > 0 else 0
+            for root in sentence_roots]
+
+def get_sentence_parse_height(sent):
+    return get_parse_heights(sent.as_doc())[0]
+
+# the spaCy components each statistics profile needs:
+# * fast: tokens and sentences only, from a blank pipeline with a rule-based
+#   sentencizer; no parse heights, noun phrases or entities
+# * standard: + parse heights (parser) and noun phrases (parser + POS from
+#   tagger/attribute_ruler)
+# * full: + entities (ner)
+# everything else, e.g. the lemmatizer, is switched off
+PROFILE_COMPONENTS = {
+    'fast': [],
+    'standard': ['tok2vec', 'tagger', 'attribute_ruler', 'parser'],
+    'full': ['tok2vec', 'tagger', 'attribute_ruler', 'parser', 'ner'],
+}
+
+def load_pipeline(profile='full', model='en_core_web_sm'):
+    if profile not in PROFILE_COMPONENTS:
+        raise ValueError(f'Invalid statistics profile ({profile}): should be one of {list(PROFILE_COMPONENTS)}.')
+    if profile == 'fast':
+        nlp = spacy.blank('en')
+        nlp.add_pipe('sentencizer')
+        return nlp
+    components = PROFILE_COMPONENTS[profile]
+    nlp = spacy.load(model)
+    nlp.select_pipes(disable=[name for name in nlp.pipe_names if name not in components])
+    return nlp
+
+class Accumulator:
+    """Running summary of a stream of non-negative integers.
+
+    Keeps the count, sum, sum of squares, min and max of the values seen,
+    plus a histogram of `n_bins` bins of `bin_width` and one last bin for
+    everything from `n_bins * bin_width` up, so memory stays constant
+    however many values are added.
+    """
+
+    def __init__(self, bin_width=1, n_bins=256):
+        self.bin_width = bin_width
+        self.n_bins = n_bins
+        self.count = 0
+        self.total = 0
+        self.total_sq = 0
+        self.min = None
+        self.max = None
+        self.histogram = [0] * (n_bins + 1)
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.histogram[min(value // self.bin_width, self.n_bins)] += 1
+
+    def extend(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Adds the values summarised by `other` (with the same bins) to this one."""
+        if (other.bin_width, other.n_bins) != (self.bin_width, self.n_bins):
+            raise ValueError('Cannot merge accumulators with different bins.')
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        self.histogram = [a + b for a, b in zip(self.histogram, other.histogram)]
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count
+
+    @property
+    def variance(self):
+        return self.total_sq / self.count - self.mean ** 2
+
+    def bin_counts(self):
+        """Maps the lower edge of every non-empty bin to its count."""
+        return {k * self.bin_width: n for k, n in enumerate(self.histogram) if n}
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'sum_sq': self.total_sq,
+            'min': self.min,
+            'max': self.max,
+            'bin_width': self.bin_width,
+            'histogram': self.histogram,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        accumulator = cls(d['bin_width'], len(d['histogram']) - 1)
+        accumulator.count = d['count']
+        accumulator.total = d['sum']
+        accumulator.total_sq = d['sum_sq']
+        accumulator.min = d['min']
+        accumulator.max = d['max']
+        accumulator.histogram = list(d['histogram'])
+        return accumulator
+
+class PartialStatistics:
+    """Statistics of some subset of a tier's articles, before aggregation.
+
+    Holds only counters, accumulators and sums, so partials computed
+    independently (e.g. one per `ArticleView.shard`, on different machines)
+    can be saved, loaded and `merge`d in any grouping,
+    and `finalize` gives the same statistics as computing them in one go.
+    Articles keep the order in which partials are merged.
+    """
+
+    # name -> (bin width, number of bins)
+    ACCUMULATORS = {
+        'sentence_lengths': (1, 512),
+        'sentence_counts': (1, 256),
+        'paragraph_counts': (1, 256),
+        'parse_heights': (1, 128),
+        'noun_phrase_counts': (1, 64),
+        'entity_count_list': (1, 64),
+    }
+
+    def __init__(self, profile='full'):
+        if profile not in PROFILE_COMPONENTS:
+            raise ValueError(f'Invalid statistics profile ({profile}): should be one of {list(PROFILE_COMPONENTS)}.')
+        self.profile = profile
+        self.ids = []
+        # per-article token counts, filled in as each article's docs come back
+        self.article_lengths = []
+        self.accumulators = {name: Accumulator(bin_width, n_bins)
+                             for name, (bin_width, n_bins) in self.ACCUMULATORS.items()}
+        self.token_counts = defaultdict(int)
+        self.entity_counts = defaultdict(int)
+
+    @property
+    def parse(self):
+        return self.profile in ('standard', 'full')
+
+    @property
+    def entities(self):
+        return self.profile == 'full'
+
+    def iter_paragraphs(self, articles, limit=None):
+        """Yields `(paragraph, k)` for every paragraph of `articles`, where `k`
+        indexes the article in `ids`, recording each article as it is read."""
+        paragraph_counts = self.accumulators['paragraph_counts']
+        for i, article in enumerate(articles):
+            print(i+1, article['id'], article['title'])
+            self.ids.append(article['id'])
+            self.article_lengths.append(0)
+            for section_title, section_paragraphs in article['text']:
+                paragraph_counts.add(len(section_paragraphs))
+                for paragraph in section_paragraphs:
+                    yield paragraph, len(self.ids) - 1
+            if limit and i + 1 >= limit:
+                break
+
+    def add_doc(self, doc, k):
+        """Adds the paragraph `doc` of the k-th article."""
+        accumulators = self.accumulators
+        sentences = list(doc.sents)
+        accumulators['sentence_counts'].add(len(sentences))
+        if self.parse:
+            accumulators['parse_heights'].extend(get_parse_heights(doc))
+        for sentence in sentences:
+            accumulators['sentence_lengths'].add(len(sentence))
+            self.article_lengths[k] += len(sentence)
+            if self.parse:
+                accumulators['noun_phrase_counts'].add(len(list(sentence.noun_chunks)))
+            if self.entities:
+                accumulators['entity_count_list'].add(len(sentence.ents))
+                # count by text, holding on to spans would keep every doc alive
+                ents = {ent.text for ent in sentence.ents}
+                for ent in ents:
+                    self.entity_counts[ent] += 1
+            for token in sentence:
+                self.token_counts[token.lower_] += 1
+
+    def merge(self, other):
+        """Adds the articles summarised by `other` to this partial."""
+        if other.profile != self.profile:
+            raise ValueError(f'Cannot merge {other.profile} statistics into {self.profile} statistics.')
+        self.ids.extend(other.ids)
+        self.article_lengths.extend(other.article_lengths)
+        for name, accumulator in self.accumulators.items():
+            accumulator.merge(other.accumulators[name])
+        for counts, other_counts in [(self.token_counts, other.token_counts),
+                                     (self.entity_counts, other.entity_counts)]:
+            for key, n in other_counts.items():
+                counts[key] += n
+        return self
+
+    def to_dict(self):
+        return {
+            'profile': self.profile,
+            'ids': self.ids,
+            'article_lengths': self.article_lengths,
+            'accumulators': {name: accumulator.to_dict() for name, accumulator in self.accumulators.items()},
+            'token_counts': self.token_counts,
+            'entity_counts': self.entity_counts,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        partial = cls(d['profile'])
+        partial.ids = list(d['ids'])
+        partial.article_lengths = list(d['article_lengths'])
+        partial.accumulators = {name: Accumulator.from_dict(accumulator)
+                                for name, accumulator in d['accumulators'].items()}
+        partial.token_counts.update(d['token_counts'])
+        partial.entity_counts.update(d['entity_counts'])
+        return partial
+
+    def save(self, path):
+        write_json(path, self.to_dict())
+
+    @classmethod
+    def load(cls, path):
+        return cls.from_dict(read_json(path))
+
+    def finalize(self):
+        """Returns the `(statistics, structures)` of the articles summarised."""
+        accumulators = self.accumulators
+        sentence_lengths = accumulators['sentence_lengths']
+        noun_phrase_counts = accumulators['noun_phrase_counts']
+        parse_heights = accumulators['parse_heights']
+        entity_count_list = accumulators['entity_count_list']
+        article_length_counts = Accumulator(bin_width=100, n_bins=1000)
+        article_length_counts.extend(self.article_lengths)
+        n_articles = article_length_counts.count
+        n_tokens = sentence_lengths.total
+        n_unique_tokens = len(self.token_counts)
+        n_sentences = accumulators['sentence_counts'].total
+        n_paragraphs = accumulators['paragraph_counts'].total
+        
+        avg_num_sentences = n_sentences / n_articles
+        avg_sentence_length = n_tokens / n_sentences
+        avg_paragraph_count = n_paragraphs / n_articles
+        avg_article_length = article_length_counts.mean
+        stats = {
+            'profile': self.profile,
+            'n_articles': n_articles,
+            'n_tokens': n_tokens,
+            'n_unique_tokens': n_unique_tokens,
+            'n_sentences': n_sentences,
+            'n_paragraphs': n_paragraphs,
+            'avg_paragraphs_per_article': avg_paragraph_count,
+            'avg_sentences_per_article': avg_num_sentences,
+            'avg_tokens_per_article': avg_article_length,
+        }
+        structures = {
+            'sentence_lengths': sentence_lengths.to_dict(),
+            'paragraph_counts': accumulators['paragraph_counts'].to_dict(),
+            'token_counts': self.token_counts,
+            'article_ids': self.ids,
+            'article_lengths': self.article_lengths,
+            'article_length_counts': article_length_counts.to_dict(),
+        }
+        if self.parse:
+            stats['n_noun_phrases'] = noun_phrase_counts.total
+            stats['avg_sentence_parse_height'] = parse_heights.mean
+            stats['avg_noun_phrases_per_sentence'] = noun_phrase_counts.mean
+            structures['parse_heights'] = parse_heights.to_dict()
+            structures['parse_height_counts'] = parse_heights.bin_counts()
+            structures['noun_phrase_counts'] = noun_phrase_counts.to_dict()
+        if self.entities:
+            stats['n_entities'] = entity_count_list.total
+            stats['avg_entities_per_sentence'] = entity_count_list.mean
+            structures['entity_count_list'] = entity_count_list.to_dict()
+        return stats, structures
+
+def partial_statistics(articles, limit=None, profile='full', nlp=None, batch_size=256, n_process=1):
+    """Computes the `PartialStatistics` of `articles`.
+
+    `profile` ('fast', 'standard' or 'full', see `PROFILE_COMPONENTS`)
+    selects which metrics are computed, and `nlp` should be a pipeline
+    loaded for it by `load_pipeline`. Paragraphs are streamed through
+    `nlp.pipe` in batches of `batch_size` on `n_process` processes; each doc
+    comes back tagged with the index of its article, so per-article numbers
+    stay attributed to the right one.
+    """
+    if nlp is None:
+        nlp = load_pipeline(profile)
+    partial = PartialStatistics(profile)
+    paragraphs = partial.iter_paragraphs(articles, limit=limit)
+    for doc, k in nlp.pipe(paragraphs, as_tuples=True, batch_size=batch_size, n_process=n_process):
+        partial.add_doc(doc, k)
+    return partial
+
+def aggregate_statistics(articles, limit=None, profile='full', nlp=None, batch_size=256, n_process=1):
+    """Computes the `(statistics, structures)` of `articles`, see `partial_statistics`."""
+    return partial_statistics(articles, limit=limit, profile=profile, nlp=nlp,
+                              batch_size=batch_size, n_process=n_process).finalize()
@@ -47,9 +47,191 @@ def print_article_summary(article):
     n_related_websites = len(article['related_websites'])
     print(f"{n_related_articles} related article(s) and {n_related_websites} related website(s)")
 
+JSON_BACKENDS = ['orjson', 'simdjson', 'json']
+
+def get_json_loads(backend=None):
+    """Returns `(name, loads)` for `backend`, or for the fastest installed one.
+
+    `loads` accepts `bytes`; every backend returns plain dicts and lists.
+    """
+    for name in ([backend] if backend else JSON_BACKENDS):
+        if name == 'orjson':
+            try:
+                import orjson
+            except ImportError:
+                continue
+            return name, orjson.loads
+        elif name == 'simdjson':
+            try:
+                import simdjson
+            except ImportError:
+                continue
+            return name, simdjson.loads
+        elif name == 'json':
+            return name, json.loads
+        else:
+            raise ValueError(f'Invalid JSON backend ({name}): should be one of {JSON_BACKENDS}.')
+    raise ImportError(f'JSON backend {backend} is not installed.')
+
+_json_whitespace = re.compile(rb'[ \t\n\r]*')
+_json_scalar = re.compile(rb'[^,}\]\s]+')
+_QUOTE, _BACKSLASH = ord('"'), ord('\\')
+_OPEN = (ord('['), ord('{'))
+_CLOSE = (ord(']'), ord('}'))
+
+def skip_json_string(s, end):
+    """Returns where the JSON string starting at `end` in the bytes `s` ends."""
+    while True:
+        end = s.find(b'"', end + 1)
+        if end < 0:
+            raise ValueError('Unterminated JSON string')
+        if s[end - 1] != _BACKSLASH:
+            return end + 1
+        # the quote is escaped if an odd number of backslashes precede it
+        k = end - 1
+        while s[k] == _BACKSLASH:
+            k -= 1
+        if (end - 1 - k) % 2 == 0:
+            return end + 1
+
+def skip_json_value(s, end):
+    """Returns where the JSON value starting at `end` in the bytes `s` ends,
+    without decoding it.
+
+    Strings are skipped with `bytes.find`, so only the few bytes between
+    them (separators, brackets, numbers) are looked at one by one.
+    """
+    n = len(s)
+    c = s[end] if end < n else None
+    if c == _QUOTE:
+        return skip_json_string(s, end)
+    if c not in _OPEN:
+        match = _json_scalar.match(s, end)
+        if match is None:
+            raise ValueError(f'Expected a JSON value at position {end}')
+        return match.end()
+    depth = 0
+    while True:
+        quote = s.find(b'"', end)
+        if quote < 0:
+            quote = n
+        for i in range(end, quote):
+            c = s[i]
+            if c in _OPEN:
+                depth += 1
+            elif c in _CLOSE:
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+        if quote == n:
+            raise ValueError('Unterminated JSON value')
+        end = skip_json_string(s, quote)
+
+def loads_fields(s, fields, loads=json.loads):
+    """Decodes only `fields` of the top-level JSON object in the bytes `s`.
+
+    Other values are only skipped over (see `skip_json_value`), not decoded,
+    and scanning stops as soon as every requested field has been seen, so
+    large values like an article's `text` are never decoded. `loads`
+    decodes the keys and requested values.
+    """
+    if isinstance(s, memoryview):
+        s = s.tobytes()
+    wanted = set(fields)
+    projected = {}
+    n = len(s)
+    end = _json_whitespace.match(s, 0).end()
+    if end >= n or s[end] != ord('{'):
+        raise ValueError('Expected a JSON object')
+    end += 1
+    while wanted:
+        end = _json_whitespace.match(s, end).end()
+        if end >= n or s[end] == ord('}'):
+            break
+        if s[end] != _QUOTE:
+            raise ValueError(f'Expected a key at position {end}')
+        key_end = skip_json_string(s, end)
+        key = loads(s[end:key_end])
+        end = _json_whitespace.match(s, key_end).end()
+        if end >= n or s[end] != ord(':'):
+            raise ValueError(f'Expected ":" at position {end}')
+        start = _json_whitespace.match(s, end + 1).end()
+        end = skip_json_value(s, start)
+        if key in wanted:
+            projected[key] = loads(s[start:end])
+            wanted.discard(key)
+        end = _json_whitespace.match(s, end).end()
+        if end < n and s[end] == ord(','):
+            end += 1
+    return projected
+
+class JSONReader:
+    """Reads JSON files and archive members with a pluggable decoder.
+
+    Files are read as bytes in one call into a per-thread buffer that is
+    reused across documents, then handed to the decoder.
+    """
+
+    def __init__(self, backend=None):
+        self.backend, self.loads = get_json_loads(backend)
+        # orjson decodes straight from a memoryview; the others need bytes
+        self._decodes_buffers = self.backend == 'orjson'
+        self._local = threading.local()
+
+    def _buffer(self, size):
+        buf = getattr(self._local, 'buf', None)
+        if buf is None or len(buf) < size:
+            buf = self._local.buf = bytearray(max(size, 1 << 16))
+        return buf
+
+    def loads_fields(self, data, fields=None):
+        """Decodes `data`, keeping only the top-level `fields` if given."""
+        if fields is None:
+            return self.loads(data)
+        return loads_fields(data, fields, self.loads)
+
+    def readinto_loads(self, f, size, fields=None):
+        """Decodes `size` bytes read from the binary file object `f`."""
+        if not self._decodes_buffers:
+            return self.loads_fields(f.read(), fields)
+        buf = self._buffer(size)
+        with memoryview(buf) as view:
+            n = 0
+            while n < size:
+                k = f.readinto(view[n:size])
+                if not k:
+                    break
+                n += k
+            return self.loads_fields(view[:n], fields)
+
+    def read(self, path, fields=None):
+        with open(path, 'rb') as f:
+            return self.readinto_loads(f, os.fstat(f.fileno()).st_size, fields)
+
+json_reader = JSONReader()
+
+def set_json_backend(backend=None):
+    """Switches the decoder used for articles, metadata and stats."""
+    global json_reader
+    json_reader = JSONReader(backend)
+
+def read_json(path, fields=None):
+    return json_reader.read(path, fields)
+
 def write_json(output_path, data):
-    with open(output_path, 'w+') as f:
-        json.dump(data, f)
+    # write next to the target and rename, so readers never see a partial
+    # file; the temp name is per process and thread so writers can't collide
+    tmp_path = f'{output_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'w+') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 def get_saved_ids(data_dir):
     data_dir = Path(data_dir)
@@ -77,14 +259,17 @@ FILE_TYPES = IMG_FILE_TYPES.union(AUDIO_FILE_TYPES).union(VIDEO_FILE_TYPES)
 def unzip(zip_output, data_dir):
     from .zipfile2 import ZipFile
     with ZipFile(zip_output, 'r') as zip_ref:
-        zip_ref.extractall(zip_output.parent)
+        zip_ref.extractall(zip_output.parent, workers=None)
 
-def download_and_unzip(url, zip_output, overwrite=False, delete_zip=False):
-    
+def download_zip(url, zip_output, overwrite=False):
     print(f'Downloading {zip_output.name} from {url} ...')
     if not zip_output.exists() or overwrite:
         import gdown
         gdown.download(url, str(zip_output), quiet=False)
+
+def download_and_unzip(url, zip_output, overwrite=False, delete_zip=False):
+    
+    download_zip(url, zip_output, overwrite=overwrite)
     
     data_dir = zip_output.parent
     unzip(zip_output, data_dir)
@@ -0,0 +1,80 @@
+from .imports import *
+from .utils import get_chunks
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ArticleView(Sequence):
+    """A lazily loaded, ordered collection of articles.
+
+    Holds only the keys (paths, archive members or article ids) of its
+    articles, in a stable order, and loads an article with `load(key)` when
+    it is indexed or iterated. Slicing returns another view, so
+    `view[1000:2000]` or `view.shard(rank, world_size)` reads nothing until
+    iterated.
+    """
+
+    def __init__(self, keys, load):
+        self.keys = keys
+        self.load = load
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ArticleView(self.keys[i], self.load)
+        return self.load(self.keys[i])
+
+    def __iter__(self):
+        for key in self.keys:
+            yield self.load(key)
+
+    def __repr__(self):
+        return f'<ArticleView of {len(self)} articles>'
+
+    def shard(self, index, count):
+        """The `index`-th of `count` disjoint shards of this view.
+
+        Shards take every `count`-th article starting at `index`, so they
+        differ in length by at most one and together cover the view exactly
+        once; each data-loader worker or node can read its own shard without
+        coordinating with the others.
+        """
+        if not 0 <= index < count:
+            raise ValueError(f'Invalid shard index ({index}): should be in [0, {count}).')
+        return self[index::count]
+
+    def batches(self, batch_size, prefetch=2, workers=None):
+        """Yields the articles of this view in lists of `batch_size` (the
+        last one may be shorter), in order.
+
+        While a batch is being consumed, up to `prefetch` further batches are
+        read and decoded on a pool of `workers` threads (one per CPU by
+        default), so disk and decompression latency overlap with the
+        consumer. `prefetch=0` loads each batch on the calling thread.
+        """
+        if batch_size < 1:
+            raise ValueError(f'Invalid batch size ({batch_size}): should be at least 1.')
+        chunks = get_chunks(self.keys, batch_size)
+        if prefetch < 1:
+            for chunk in chunks:
+                yield [self.load(key) for key in chunk]
+            return
+        if workers is None:
+            workers = os.cpu_count() or 1
+        with ThreadPoolExecutor(workers) as executor:
+            pending = deque()
+            try:
+                for chunk in chunks:
+                    pending.append([executor.submit(self.load, key) for key in chunk])
+                    if len(pending) > prefetch:
+                        yield [future.result() for future in pending.popleft()]
+                while pending:
+                    yield [future.result() for future in pending.popleft()]
+            finally:
+                # stop loading ahead if the consumer stops early
+                for batch in pending:
+                    for future in batch:
+                        future.cancel()
@@ -13,6 +13,8 @@ import stat
 import shutil
 import struct
 import binascii
+import mmap
+from array import array
 
 try:
     import threading
@@ -315,6 +317,20 @@ def _EndRecData(fpin):
     return None
 
 
+def _normalize_filename(filename):
+    # Terminate the file name at the first null byte.  Null bytes in file
+    # names are used as tricks by viruses in archives.
+    null_byte = filename.find(chr(0))
+    if null_byte >= 0:
+        filename = filename[0:null_byte]
+    # This is used to ensure paths in generated ZIP files always use
+    # forward slashes as the directory separator, as required by the
+    # ZIP format specification.
+    if os.sep != "/" and os.sep in filename:
+        filename = filename.replace(os.sep, "/")
+    return filename
+
+
 class ZipInfo (object):
     """Class with attributes describing each file in the ZIP archive."""
 
@@ -342,19 +358,7 @@ class ZipInfo (object):
 
     def __init__(self, filename="NoName", date_time=(1980,1,1,0,0,0)):
         self.orig_filename = filename   # Original file name in archive
-
-        # Terminate the file name at the first null byte.  Null bytes in file
-        # names are used as tricks by viruses in archives.
-        null_byte = filename.find(chr(0))
-        if null_byte >= 0:
-            filename = filename[0:null_byte]
-        # This is used to ensure paths in generated ZIP files always use
-        # forward slashes as the directory separator, as required by the
-        # ZIP format specification.
-        if os.sep != "/" and os.sep in filename:
-            filename = filename.replace(os.sep, "/")
-
-        self.filename = filename        # Normalized file name
+        self.filename = _normalize_filename(filename)  # Normalized file name
         self.date_time = date_time      # year, month, day, hour, min, sec
 
         if date_time[0] < 1980:
@@ -711,6 +715,17 @@ def _get_decompressor(compress_type):
             raise NotImplementedError("compression type %d" % (compress_type,))
 
 
+def _copymember(source, target, length=1024 * 1024):
+    """Copy an open member to target through one preallocated buffer."""
+    buf = bytearray(length)
+    with memoryview(buf) as view:
+        while True:
+            n = source.readinto(view)
+            if not n:
+                break
+            target.write(view[:n])
+
+
 class _SharedFile:
     def __init__(self, file, pos, close, lock, writing):
         self._file = file
@@ -730,6 +745,55 @@ class _SharedFile:
             self._pos = self._file.tell()
             return data
 
+    def readinto(self, b):
+        with self._lock:
+            if self._writing():
+                raise ValueError("Can't read from the ZIP file while there "
+                        "is an open writing handle on it. "
+                        "Close the writing handle before trying to read.")
+            self._file.seek(self._pos)
+            if hasattr(self._file, 'readinto'):
+                n = self._file.readinto(b)
+            else:
+                data = self._file.read(len(b))
+                n = len(data)
+                b[:n] = data
+            self._pos = self._file.tell()
+            return n
+
+    def close(self):
+        if self._file is not None:
+            fileobj = self._file
+            self._file = None
+            self._close(fileobj)
+
+class _PositionalFile:
+    """Reads at its own offset with os.pread, so concurrent readers of one
+    archive neither take the shared lock nor move the shared file position.
+    """
+    def __init__(self, file, pos, close):
+        self._file = file
+        self._fd = file.fileno()
+        self._pos = pos
+        self._close = close
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = max(os.fstat(self._fd).st_size - self._pos, 0)
+        data = os.pread(self._fd, n, self._pos)
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b):
+        if hasattr(os, 'preadv'):
+            n = os.preadv(self._fd, [b], self._pos)
+        else:
+            data = os.pread(self._fd, len(b), self._pos)
+            n = len(data)
+            b[:n] = data
+        self._pos += n
+        return n
+
     def close(self):
         if self._file is not None:
             fileobj = self._file
@@ -850,13 +914,15 @@ class ZipExtFile(io.BufferedIOBase):
         """Read and return up to n bytes.
         If the argument is omitted, None, or negative, data is read and returned until EOF is reached..
         """
+        # Chunks are collected and joined once instead of growing a bytes
+        # object, which copied the whole result on every chunk.
         if n is None or n < 0:
-            buf = self._readbuffer[self._offset:]
+            chunks = [self._readbuffer[self._offset:]]
             self._readbuffer = b''
             self._offset = 0
             while not self._eof:
-                buf += self._read1(self.MAX_N)
-            return buf
+                chunks.append(self._read1(self.MAX_N))
+            return b''.join(chunks)
 
         end = n + self._offset
         if end < len(self._readbuffer):
@@ -865,7 +931,7 @@ class ZipExtFile(io.BufferedIOBase):
             return buf
 
         n = end - len(self._readbuffer)
-        buf = self._readbuffer[self._offset:]
+        chunks = [self._readbuffer[self._offset:]]
         self._readbuffer = b''
         self._offset = 0
         while n > 0 and not self._eof:
@@ -873,11 +939,57 @@ class ZipExtFile(io.BufferedIOBase):
             if n < len(data):
                 self._readbuffer = data
                 self._offset = n
-                buf += data[:n]
+                chunks.append(data[:n])
                 break
-            buf += data
+            chunks.append(data)
             n -= len(data)
-        return buf
+        return b''.join(chunks)
+
+    def readinto(self, b):
+        """Read bytes into the pre-allocated, writable bytes-like object b and
+        return the number of bytes read (0 at EOF).
+
+        Unencrypted ZIP_STORED members are read straight from the archive
+        into b, without an intermediate bytes object.
+        """
+        with memoryview(b) as raw, raw.cast('B') as view:
+            size = len(view)
+            pos = min(len(self._readbuffer) - self._offset, size)
+            if pos > 0:
+                with memoryview(self._readbuffer) as buffered:
+                    view[:pos] = buffered[self._offset:self._offset + pos]
+                self._offset += pos
+                if self._offset >= len(self._readbuffer):
+                    self._readbuffer = b''
+                    self._offset = 0
+            else:
+                pos = 0
+            if (pos < size and self._compress_type == ZIP_STORED
+                    and self._decrypter is None):
+                pos += self._readinto_stored(view[pos:])
+            while pos < size and not self._eof:
+                data = self._read1(size - pos)
+                k = min(len(data), size - pos)
+                view[pos:pos + k] = data[:k]
+                if k < len(data):
+                    self._readbuffer = data
+                    self._offset = k
+                pos += k
+            return pos
+
+    def _readinto_stored(self, view):
+        # Read a stored member directly into view, checking the CRC in place.
+        n = min(len(view), self._left, self._compress_left)
+        if self._eof or n <= 0:
+            return 0
+        k = self._fileobj.readinto(view[:n])
+        if not k:
+            raise EOFError
+        self._compress_left -= k
+        self._left -= k
+        self._eof = self._left <= 0 or self._compress_left <= 0
+        self._update_crc(view[:k])
+        return k
 
     def _update_crc(self, newdata):
         # Update the CRC using the given data.
@@ -899,7 +1011,7 @@ class ZipExtFile(io.BufferedIOBase):
             while not self._eof:
                 data = self._read1(self.MAX_N)
                 if data:
-                    buf += data
+                    buf = buf + data if buf else data
                     break
             return buf
 
@@ -919,10 +1031,9 @@ class ZipExtFile(io.BufferedIOBase):
                 if n < len(data):
                     self._readbuffer = data
                     self._offset = n
-                    buf += data[:n]
-                    break
+                    data = data[:n]
                 if data:
-                    buf += data
+                    buf = buf + data if buf else data
                     break
         return buf
 
@@ -1060,6 +1171,312 @@ class _ZipWriteFile(io.BufferedIOBase):
         self._zipfile.filelist.append(self._zinfo)
         self._zipfile.NameToInfo[self._zinfo.filename] = self._zinfo
 
+def _make_zipinfo(data, offset, filename, concat):
+    """Build the ZipInfo of the central directory record at data[offset:]."""
+    centdir = struct.unpack_from(structCentralDir, data, offset)
+    start = offset + sizeCentralDir + centdir[_CD_FILENAME_LENGTH]
+    # Create ZipInfo instance to store file information
+    x = ZipInfo(filename)
+    x.extra = data[start:start + centdir[_CD_EXTRA_FIELD_LENGTH]]
+    start += centdir[_CD_EXTRA_FIELD_LENGTH]
+    x.comment = data[start:start + centdir[_CD_COMMENT_LENGTH]]
+    x.header_offset = centdir[_CD_LOCAL_HEADER_OFFSET]
+    (x.create_version, x.create_system, x.extract_version, x.reserved,
+     x.flag_bits, x.compress_type, t, d,
+     x.CRC, x.compress_size, x.file_size) = centdir[1:12]
+    x.volume, x.internal_attr, x.external_attr = centdir[15:18]
+    # Convert date/time code to (year, month, day, hour, min, sec)
+    x._raw_time = t
+    x.date_time = ( (d>>9)+1980, (d>>5)&0xF, d&0x1F,
+                    t>>11, (t>>5)&0x3F, (t&0x1F) * 2 )
+
+    x._decodeExtra()
+    x.header_offset = x.header_offset + concat
+    return x
+
+
+_CD_FLAGS_STRUCT = struct.Struct('<H')
+_CD_LENGTHS_STRUCT = struct.Struct('<3H')
+_CD_FLAGS_OFFSET = 8
+_CD_LENGTHS_OFFSET = 28
+
+
+class _CentralDirectory:
+    """Compact, read-only view of a parsed central directory.
+
+    Only the raw directory bytes, one offset per record and the decoded
+    member names are kept; ZipInfo objects are built the first time a
+    member is asked for.  Opening archives with 100k+ members no longer
+    allocates a ZipInfo (and its extra/comment bytes) per member.
+    """
+
+    def __init__(self, data, concat):
+        self._data = data
+        self._concat = concat
+        self.offsets = array('Q')
+        self.names = []
+        self.index = {}
+        total = 0
+        size_cd = len(data)
+        while total < size_cd:
+            if total + sizeCentralDir > size_cd:
+                raise BadZipFile("Truncated central directory")
+            if data[total:total + 4] != stringCentralDir:
+                raise BadZipFile("Bad magic number for central directory")
+            extract_version = data[total + 6]
+            if extract_version > MAX_EXTRACT_VERSION:
+                raise NotImplementedError("zip file version %.1f" %
+                                          (extract_version / 10))
+            flags, = _CD_FLAGS_STRUCT.unpack_from(data, total + _CD_FLAGS_OFFSET)
+            name_len, extra_len, comment_len = _CD_LENGTHS_STRUCT.unpack_from(
+                data, total + _CD_LENGTHS_OFFSET)
+            start = total + sizeCentralDir
+            filename = data[start:start + name_len]
+            if flags & 0x800:
+                # UTF-8 file names extension
+                filename = filename.decode('utf-8')
+            else:
+                # Historical ZIP filename encoding
+                filename = filename.decode('cp437')
+            self.index[_normalize_filename(filename)] = len(self.names)
+            self.names.append(filename)
+            self.offsets.append(total)
+            total = start + name_len + extra_len + comment_len
+        self._infos = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def namelist(self):
+        return [_normalize_filename(name) for name in self.names]
+
+    def getinfo(self, name):
+        i = self.index.get(name)
+        if i is None:
+            return None
+        return self.info(i)
+
+    def info(self, i):
+        """Return the ZipInfo for the i-th record, building it if needed."""
+        x = self._infos.get(i)
+        if x is None:
+            x = self._infos[i] = _make_zipinfo(
+                self._data, self.offsets[i], self.names[i], self._concat)
+        return x
+
+    def infolist(self):
+        return [self.info(i) for i in range(len(self))]
+
+
+# The sidecar index ("<archive>.idx") written next to an archive: a header,
+# then the record offsets, the records sorted by name, the name offsets, the
+# names, the archive comment and the raw central directory.
+structSidecarHeader = "<8sQqqQQ7QH"
+stringSidecar = b"KBZIDX01"
+sizeSidecarHeader = struct.calcsize(structSidecarHeader)
+_SIDECAR_SUFFIX = '.idx'
+
+_Q_STRUCT = struct.Struct('<Q')
+
+
+def _sidecar_path(filename):
+    return filename + _SIDECAR_SUFFIX
+
+
+def _write_sidecar(path, st, centdir, start_dir, comment):
+    """Write centdir to the sidecar index at path, stamped with the archive's
+    size and mtime.  The file is replaced atomically."""
+    n = len(centdir)
+    names = [name.encode('utf-8', 'surrogateescape') for name in centdir.names]
+    normalized = [_normalize_filename(name) for name in centdir.names]
+    order = array('Q', sorted(range(n), key=normalized.__getitem__))
+    name_offsets = array('Q', [0])
+    for name in names:
+        name_offsets.append(name_offsets[-1] + len(name))
+    offsets = array('Q', centdir.offsets)
+    if sys.byteorder != 'little':
+        for a in (order, name_offsets, offsets):
+            a.byteswap()
+    blobs = [offsets.tobytes(), order.tobytes(), name_offsets.tobytes(),
+             b''.join(names), comment, bytes(centdir._data)]
+    sections = []
+    pos = sizeSidecarHeader
+    for blob in blobs:
+        pos += -pos % 8     # keep every section 8-byte aligned
+        sections.append(pos)
+        pos += len(blob)
+    header = struct.pack(structSidecarHeader, stringSidecar, st.st_size,
+                         st.st_mtime_ns, centdir._concat, start_dir, n,
+                         *sections, len(centdir._data), len(comment))
+    # unique per writer, so concurrent openers don't clobber each other
+    tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+    try:
+        with io.open(tmp, 'wb') as f:
+            f.write(header)
+            for start, blob in zip(sections, blobs):
+                f.write(b'\0' * (start - f.tell()))
+                f.write(blob)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class _SidecarCentralDirectory:
+    """Central directory served from a memory-mapped sidecar index.
+
+    Nothing is parsed up front: lookups binary-search the sorted name table
+    and ZipInfo objects are built from the mapped record on demand, so
+    opening a large archive costs an mmap instead of a directory walk.
+    """
+
+    def __init__(self, mm, header, path):
+        (_, _, _, self._concat, self.start_dir, self._n,
+         self._offsets, self._order, self._name_offsets, self._names,
+         comment_start, self._cd, cd_size, comment_size) = header
+        self._mm = mm
+        self._header = header
+        self._path = path
+        self.comment = mm[comment_start:comment_start + comment_size]
+        self._infos = {}
+
+    @classmethod
+    def load(cls, path, st):
+        """Map the sidecar index at path, or return None if it is missing or
+        was not written for an archive of this size and mtime."""
+        try:
+            with io.open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(mm) < sizeSidecarHeader:
+            mm.close()
+            return None
+        header = struct.unpack_from(structSidecarHeader, mm, 0)
+        if (header[0] != stringSidecar or header[1] != st.st_size
+                or header[2] != st.st_mtime_ns
+                or not cls._check_bounds(mm, header)):
+            mm.close()
+            return None
+        return cls(mm, header, path)
+
+    @staticmethod
+    def _check_bounds(mm, header):
+        # A truncated or partly overwritten index must be rebuilt rather
+        # than read past its end.
+        (_, _, _, _, _, n, offsets, order, name_offsets, names,
+         comment_start, cd, cd_size, comment_size) = header
+        size = len(mm)
+        for start, length in ((offsets, 8 * n), (order, 8 * n),
+                              (name_offsets, 8 * (n + 1)),
+                              (comment_start, comment_size), (cd, cd_size)):
+            if start < sizeSidecarHeader or start + length > size:
+                return False
+        names_size, = _Q_STRUCT.unpack_from(mm, name_offsets + 8 * n)
+        return sizeSidecarHeader <= names and names + names_size <= size
+
+    def __len__(self):
+        return self._n
+
+    def _name(self, i):
+        mm = self._mm or self._reload()
+        start = self._name_offsets + 8 * i
+        a, = _Q_STRUCT.unpack_from(mm, start)
+        b, = _Q_STRUCT.unpack_from(mm, start + 8)
+        return mm[self._names + a:self._names + b].decode('utf-8', 'surrogateescape')
+
+    def _sorted_name(self, k):
+        i, = _Q_STRUCT.unpack_from(self._mm or self._reload(),
+                                   self._order + 8 * k)
+        return _normalize_filename(self._name(i)), i
+
+    @property
+    def names(self):
+        return [self._name(i) for i in range(self._n)]
+
+    def namelist(self):
+        return [_normalize_filename(name) for name in self.names]
+
+    def _find(self, name):
+        # Rightmost match, so duplicated names resolve to the last record
+        # like NameToInfo does.
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if name < self._sorted_name(mid)[0]:
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo:
+            found, i = self._sorted_name(lo - 1)
+            if found == name:
+                return i
+        return None
+
+    def names_with_prefix(self, prefix):
+        # leftmost name >= prefix, then the run of names starting with it
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._sorted_name(mid)[0] < prefix:
+                lo = mid + 1
+            else:
+                hi = mid
+        names = []
+        for k in range(lo, self._n):
+            name = self._sorted_name(k)[0]
+            if not name.startswith(prefix):
+                break
+            names.append(name)
+        return names
+
+    def getinfo(self, name):
+        i = self._find(name)
+        if i is None:
+            return None
+        return self.info(i)
+
+    def info(self, i):
+        x = self._infos.get(i)
+        if x is None:
+            mm = self._mm or self._reload()
+            offset, = _Q_STRUCT.unpack_from(mm, self._offsets + 8 * i)
+            x = self._infos[i] = _make_zipinfo(
+                mm, self._cd + offset, self._name(i), self._concat)
+        return x
+
+    def infolist(self):
+        return [self.info(i) for i in range(self._n)]
+
+    def close(self):
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+
+    def detach(self):
+        """Release the mapping (and the descriptor it holds).  Names and
+        infos stay available after ZipFile.close() as with a parsed
+        directory: the index is read back into memory on first use."""
+        mm = self._mm
+        if isinstance(mm, mmap.mmap):
+            self._mm = None
+            mm.close()
+
+    def _reload(self):
+        try:
+            with io.open(self._path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        if (len(data) < sizeSidecarHeader or
+                struct.unpack_from(structSidecarHeader, data, 0) != self._header):
+            raise ValueError('Attempt to use ZIP archive that was already closed')
+        self._mm = data
+        return data
+
+
 class ZipFile:
     """ Class with methods to open, read, write, close, list zip files.
 
@@ -1074,13 +1491,17 @@ class ZipFile:
     allowZip64: if True ZipFile will create files with ZIP64 extensions when
                 needed, otherwise it will raise an exception when this would
                 be necessary.
+    sidecar: if True (mode 'r' only) the central directory is served from a
+             memory-mapped "<file>.idx" index next to the archive, which is
+             (re)written whenever it is missing or stale.
 
     """
 
     fp = None                   # Set here since __del__ checks it
     _windows_illegal_name_trans_table = None
 
-    def __init__(self, file, mode="r", compression=ZIP_STORED, allowZip64=True):
+    def __init__(self, file, mode="r", compression=ZIP_STORED, allowZip64=True,
+                 sidecar=False):
         """Open the ZIP file with mode read 'r', write 'w', exclusive create 'x',
         or append 'a'."""
         if mode not in ('r', 'w', 'x', 'a'):
@@ -1091,8 +1512,9 @@ class ZipFile:
         self._allowZip64 = allowZip64
         self._didModify = False
         self.debug = 0  # Level of printing: 0 through 3
-        self.NameToInfo = {}    # Find file info given name
-        self.filelist = []      # List of ZipInfo instances for archive
+        self._NameToInfo = {}   # Find file info given name
+        self._filelist = []     # List of ZipInfo instances for archive
+        self._centdir = None    # Compact central directory, mode 'r' only
         self.compression = compression  # Method of compression
         self.mode = mode
         self.pwd = None
@@ -1125,10 +1547,21 @@ class ZipFile:
         self._lock = threading.RLock()
         self._seekable = True
         self._writing = False
+        # Members of a read-only archive on a real file are read with
+        # os.pread, without serializing on self._lock.
+        self._positional = mode == 'r' and hasattr(os, 'pread')
+        if self._positional:
+            try:
+                self.fp.fileno()
+            except (AttributeError, OSError, ValueError):
+                self._positional = False
 
         try:
             if mode == 'r':
-                self._RealGetContents()
+                if not (sidecar and self._LoadSidecar()):
+                    self._RealGetContents()
+                    if sidecar:
+                        self._WriteSidecar()
             elif mode in ('w', 'x'):
                 # set the modified flag so central directory gets written
                 # even if no files are added to the archive
@@ -1149,6 +1582,7 @@ class ZipFile:
                 try:
                     # See if file is a zip file
                     self._RealGetContents()
+                    self._materialize()
                     # seek to start of directory and overwrite
                     self.fp.seek(self.start_dir)
                 except BadZipFile:
@@ -1215,58 +1649,64 @@ class ZipFile:
         self.start_dir = offset_cd + concat
         fp.seek(self.start_dir, 0)
         data = fp.read(size_cd)
-        fp = io.BytesIO(data)
-        total = 0
-        while total < size_cd:
-            centdir = fp.read(sizeCentralDir)
-            if len(centdir) != sizeCentralDir:
-                raise BadZipFile("Truncated central directory")
-            centdir = struct.unpack(structCentralDir, centdir)
-            if centdir[_CD_SIGNATURE] != stringCentralDir:
-                raise BadZipFile("Bad magic number for central directory")
-            if self.debug > 2:
-                print(centdir)
-            filename = fp.read(centdir[_CD_FILENAME_LENGTH])
-            flags = centdir[5]
-            if flags & 0x800:
-                # UTF-8 file names extension
-                filename = filename.decode('utf-8')
-            else:
-                # Historical ZIP filename encoding
-                filename = filename.decode('cp437')
-            # Create ZipInfo instance to store file information
-            x = ZipInfo(filename)
-            x.extra = fp.read(centdir[_CD_EXTRA_FIELD_LENGTH])
-            x.comment = fp.read(centdir[_CD_COMMENT_LENGTH])
-            x.header_offset = centdir[_CD_LOCAL_HEADER_OFFSET]
-            (x.create_version, x.create_system, x.extract_version, x.reserved,
-             x.flag_bits, x.compress_type, t, d,
-             x.CRC, x.compress_size, x.file_size) = centdir[1:12]
-            if x.extract_version > MAX_EXTRACT_VERSION:
-                raise NotImplementedError("zip file version %.1f" %
-                                          (x.extract_version / 10))
-            x.volume, x.internal_attr, x.external_attr = centdir[15:18]
-            # Convert date/time code to (year, month, day, hour, min, sec)
-            x._raw_time = t
-            x.date_time = ( (d>>9)+1980, (d>>5)&0xF, d&0x1F,
-                            t>>11, (t>>5)&0x3F, (t&0x1F) * 2 )
-
-            x._decodeExtra()
-            x.header_offset = x.header_offset + concat
-            self.filelist.append(x)
-            self.NameToInfo[x.filename] = x
+        if len(data) != size_cd:
+            raise BadZipFile("Truncated central directory")
+        self._centdir = _CentralDirectory(data, concat)
+
+    def _LoadSidecar(self):
+        """Serve the table of contents from a valid sidecar index, if any."""
+        if self._filePassed or self.filename is None:
+            return False
+        st = os.stat(self.fp.fileno())
+        centdir = _SidecarCentralDirectory.load(_sidecar_path(self.filename), st)
+        if centdir is None:
+            return False
+        self.start_dir = centdir.start_dir
+        self._comment = centdir.comment
+        self._centdir = centdir
+        return True
 
-            # update total bytes read from central directory
-            total = (total + sizeCentralDir + centdir[_CD_FILENAME_LENGTH]
-                     + centdir[_CD_EXTRA_FIELD_LENGTH]
-                     + centdir[_CD_COMMENT_LENGTH])
+    def _WriteSidecar(self):
+        """Save the table of contents next to the archive; best effort."""
+        if self._filePassed or self.filename is None:
+            return
+        st = os.stat(self.fp.fileno())
+        try:
+            _write_sidecar(_sidecar_path(self.filename), st, self._centdir,
+                           self.start_dir, self._comment)
+        except OSError:
+            # read-only directories and the like simply go without an index
+            pass
+
+    def _materialize(self):
+        """Build every ZipInfo of a compact central directory and switch to
+        the plain filelist/NameToInfo representation."""
+        centdir = self._centdir
+        if centdir is None:
+            return
+        self._centdir = None
+        for x in centdir.infolist():
+            self._filelist.append(x)
+            self._NameToInfo[x.filename] = x
+        if isinstance(centdir, _SidecarCentralDirectory):
+            centdir.close()
 
-            if self.debug > 2:
-                print("total", total)
+    @property
+    def filelist(self):
+        """List of ZipInfo instances for archive."""
+        self._materialize()
+        return self._filelist
 
+    @property
+    def NameToInfo(self):
+        """Find file info given name."""
+        self._materialize()
+        return self._NameToInfo
 
     def namelist(self):
         """Return a list of file names in the archive."""
+        if self._centdir is not None:
+            return self._centdir.namelist()
         return [data.filename for data in self.filelist]
 
     def infolist(self):
@@ -1274,6 +1714,19 @@ class ZipFile:
         archive."""
         return self.filelist
 
+    @property
+    def indexed(self):
+        """True if the central directory is served from a sidecar index,
+        so that names_with_prefix() is a binary search."""
+        return isinstance(self._centdir, _SidecarCentralDirectory)
+
+    def names_with_prefix(self, prefix):
+        """Return the sorted names in the archive that start with prefix."""
+        if self.indexed:
+            return self._centdir.names_with_prefix(prefix)
+        return sorted(name for name in self.namelist()
+                      if name.startswith(prefix))
+
     def printdir(self, file=None):
         """Print a table of contents for the zip file."""
         print("%-46s %19s %12s" % ("File Name", "Modified    ", "Size"),
@@ -1298,7 +1751,10 @@ class ZipFile:
 
     def getinfo(self, name):
         """Return the instance of ZipInfo given 'name'."""
-        info = self.NameToInfo.get(name)
+        if self._centdir is not None:
+            info = self._centdir.getinfo(name)
+        else:
+            info = self.NameToInfo.get(name)
         if info is None:
             raise KeyError(
                 'There is no item named %r in the archive' % name)
@@ -1384,8 +1840,18 @@ class ZipFile:
 
         # Open for reading:
         self._fileRefCnt += 1
-        zef_file = _SharedFile(self.fp, zinfo.header_offset,
-                               self._fpclose, self._lock, lambda: self._writing)
+        if self._positional:
+            zef_file = _PositionalFile(self.fp, zinfo.header_offset,
+                                       self._fpclose)
+        else:
+            zef_file = _SharedFile(self.fp, zinfo.header_offset,
+                                   self._fpclose, self._lock,
+                                   lambda: self._writing)
+        return self._open_member(zef_file, zinfo, mode, pwd, name)
+
+    def _open_member(self, zef_file, zinfo, mode, pwd, name):
+        """Check the local file header read from zef_file and return a
+        ZipExtFile positioned at the start of the member's data."""
         try:
             # Skip the file header:
             fheader = zef_file.read(sizeFileHeader)
@@ -1506,11 +1972,12 @@ class ZipFile:
 
         return self._extract_member(member, path, pwd)
 
-    def extractall(self, path=None, members=None, pwd=None):
+    def extractall(self, path=None, members=None, pwd=None, workers=1):
         """Extract all members from the archive to the current working
            directory. `path' specifies a different directory to extract to.
            `members' is optional and must be a subset of the list returned
-           by namelist().
+           by namelist(). `workers' is the number of threads extracting
+           members in parallel; None uses one per CPU.
         """
         if members is None:
             members = self.namelist()
@@ -1520,8 +1987,62 @@ class ZipFile:
         else:
             path = os.fspath(path)
 
-        for zipinfo in members:
-            self._extract_member(zipinfo, path, pwd)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers <= 1:
+            for zipinfo in members:
+                self._extract_member(zipinfo, path, pwd)
+            return
+
+        members = [m if isinstance(m, ZipInfo) else self.getinfo(m)
+                   for m in members]
+        targetpaths = [self._get_targetpath(m, path) for m in members]
+
+        # Create every directory up front, once, instead of once per member.
+        dirs = set()
+        for member, targetpath in zip(members, targetpaths):
+            dirs.add(targetpath if member.is_dir()
+                     else os.path.dirname(targetpath))
+        for d in sorted(dirs):
+            if d:
+                os.makedirs(d, exist_ok=True)
+
+        # Each worker thread reads with pread or through its own file handle,
+        # so members are read and inflated concurrently instead of behind
+        # self._lock.
+        local = threading.local()
+        handles = []
+        handles_lock = threading.Lock()
+
+        def open_member(member):
+            if (self._positional or self._filePassed
+                    or self.filename is None):
+                return self.open(member, pwd=pwd)
+            fp = getattr(local, 'fp', None)
+            if fp is None:
+                fp = local.fp = io.open(self.filename, 'rb')
+                with handles_lock:
+                    handles.append(fp)
+            zef_file = _SharedFile(fp, member.header_offset,
+                                   lambda f: None, threading.RLock(),
+                                   lambda: self._writing)
+            return self._open_member(zef_file, member, 'r', pwd, member)
+
+        def extract(member, targetpath):
+            if member.is_dir():
+                return
+            with open_member(member) as source, \
+                 open(targetpath, "wb") as target:
+                _copymember(source, target)
+
+        from concurrent.futures import ThreadPoolExecutor
+        try:
+            with ThreadPoolExecutor(workers) as executor:
+                for _ in executor.map(extract, members, targetpaths):
+                    pass
+        finally:
+            for fp in handles:
+                fp.close()
 
     @classmethod
     def _sanitize_windows_name(cls, arcname, pathsep):
@@ -1538,13 +2059,10 @@ class ZipFile:
         arcname = pathsep.join(x for x in arcname if x)
         return arcname
 
-    def _extract_member(self, member, targetpath, pwd):
-        """Extract the ZipInfo object 'member' to a physical
-           file on the path targetpath.
+    def _get_targetpath(self, member, targetpath):
+        """Return the sanitized path member would be extracted to below
+           targetpath.
         """
-        if not isinstance(member, ZipInfo):
-            member = self.getinfo(member)
-
         # build the destination pathname, replacing
         # forward slashes to platform specific separators.
         arcname = member.filename.replace('/', os.path.sep)
@@ -1562,7 +2080,16 @@ class ZipFile:
             arcname = self._sanitize_windows_name(arcname, os.path.sep)
 
         targetpath = os.path.join(targetpath, arcname)
-        targetpath = os.path.normpath(targetpath)
+        return os.path.normpath(targetpath)
+
+    def _extract_member(self, member, targetpath, pwd):
+        """Extract the ZipInfo object 'member' to a physical
+           file on the path targetpath.
+        """
+        if not isinstance(member, ZipInfo):
+            member = self.getinfo(member)
+
+        targetpath = self._get_targetpath(member, targetpath)
 
         # Create all upper directories if necessary.
         upperdirs = os.path.dirname(targetpath)
@@ -1576,7 +2103,7 @@ class ZipFile:
 
         with self.open(member, pwd=pwd) as source, \
              open(targetpath, "wb") as target:
-            shutil.copyfileobj(source, target)
+            _copymember(source, target)
 
         return targetpath
 
@@ -1653,17 +2180,7 @@ class ZipFile:
         the name of the file in the archive."""
         if isinstance(data, str):
             data = data.encode("utf-8")
-        if not isinstance(zinfo_or_arcname, ZipInfo):
-            zinfo = ZipInfo(filename=zinfo_or_arcname,
-                            date_time=time.localtime(time.time())[:6])
-            zinfo.compress_type = self.compression
-            if zinfo.filename[-1] == '/':
-                zinfo.external_attr = 0o40775 << 16   # drwxrwxr-x
-                zinfo.external_attr |= 0x10           # MS-DOS directory flag
-            else:
-                zinfo.external_attr = 0o600 << 16     # ?rw-------
-        else:
-            zinfo = zinfo_or_arcname
+        zinfo = self._writestr_zinfo(zinfo_or_arcname)
 
         if not self.fp:
             raise ValueError(
@@ -1681,6 +2198,85 @@ class ZipFile:
             with self.open(zinfo, mode='w') as dest:
                 dest.write(data)
 
+    def _writestr_zinfo(self, zinfo_or_arcname):
+        if isinstance(zinfo_or_arcname, ZipInfo):
+            return zinfo_or_arcname
+        zinfo = ZipInfo(filename=zinfo_or_arcname,
+                        date_time=time.localtime(time.time())[:6])
+        zinfo.compress_type = self.compression
+        if zinfo.filename[-1] == '/':
+            zinfo.external_attr = 0o40775 << 16   # drwxrwxr-x
+            zinfo.external_attr |= 0x10           # MS-DOS directory flag
+        else:
+            zinfo.external_attr = 0o600 << 16     # ?rw-------
+        return zinfo
+
+    def writestrs(self, items, compress_type=None, workers=None):
+        """Write many files into the archive.  'items' yields
+        (zinfo_or_arcname, data) pairs as taken by writestr().  Members are
+        compressed on 'workers' threads (None uses one per CPU) with their
+        CRC and sizes computed up front, then appended in the order given,
+        so the archive is identical whatever the number of workers."""
+        if not self.fp:
+            raise ValueError(
+                "Attempt to write to ZIP archive that was already closed")
+        if self._writing:
+            raise ValueError(
+                "Can't write to ZIP archive while an open writing handle exists."
+            )
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        def compress(item):
+            zinfo_or_arcname, data = item
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            zinfo = self._writestr_zinfo(zinfo_or_arcname)
+            if compress_type is not None:
+                zinfo.compress_type = compress_type
+            zinfo.file_size = len(data)
+            zinfo.CRC = crc32(data)
+            compressor = _get_compressor(zinfo.compress_type)
+            if compressor:
+                data = compressor.compress(data) + compressor.flush()
+            zinfo.compress_size = len(data)
+            return zinfo, data
+
+        # Compress a bounded window of members ahead of the writer so memory
+        # stays proportional to the number of workers, not the archive.
+        from concurrent.futures import ThreadPoolExecutor
+        items = iter(items)
+        window = max(workers, 1) * 4
+        with ThreadPoolExecutor(workers) as executor:
+            while True:
+                chunk = [item for _, item in zip(range(window), items)]
+                if not chunk:
+                    break
+                for zinfo, data in executor.map(compress, chunk):
+                    self._write_compressed(zinfo, data)
+
+    def _write_compressed(self, zinfo, data):
+        """Append a member whose compressed data, CRC and sizes are known."""
+        with self._lock:
+            zinfo.flag_bits = 0x00
+            if zinfo.compress_type == ZIP_LZMA:
+                # Compressed data includes an end-of-stream (EOS) marker
+                zinfo.flag_bits |= 0x02
+            if not zinfo.external_attr:
+                zinfo.external_attr = 0o600 << 16  # permissions: ?rw-------
+            zip64 = self._allowZip64 and (zinfo.file_size > ZIP64_LIMIT or
+                                          zinfo.compress_size > ZIP64_LIMIT)
+            if self._seekable:
+                self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+            self._writecheck(zinfo)
+            self._didModify = True
+            self.fp.write(zinfo.FileHeader(zip64))
+            self.fp.write(data)
+            self.start_dir = self.fp.tell()
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+
     def __del__(self):
         """Call the "close()" method in case the user forgot."""
         self.close()
@@ -1706,6 +2302,8 @@ class ZipFile:
             fp = self.fp
             self.fp = None
             self._fpclose(fp)
+            if isinstance(self._centdir, _SidecarCentralDirectory):
+                self._centdir.detach()
 
     def _write_end_record(self):
         for zinfo in self.filelist:         # write central directory
@@ -12,6 +12,9 @@ setup(
         "spacy",
         "gdown",
     ],
+    extras_require={
+        "fast": ["orjson"],
+    },
     author="Joseph Cappadona",
     author_email="josephcappadona27@gmail.com",
     description="a library to scrape and use data from kids.britannica.com",